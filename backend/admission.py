@@ -0,0 +1,182 @@
+"""Контроль допуска (admission control) для эндпоинтов, обращающихся к БД.
+
+Каждый маршрут относится к классу: дешёвые чтения, записи, поиск, массовые
+операции. Одновременно выполняется не больше ADMISSION_MAX_CONCURRENT
+запросов всех классов и не больше лимита своего класса; остальные ждут в
+ограниченной очереди класса. Освободившийся слот получает ожидающий из
+класса с наивысшим приоритетом (меньшее число — выше), которому позволяет
+лимит класса.
+
+Запрос, для которого очередь класса заполнена или слот не освободился за
+время ожидания класса, сразу получает 503 с Retry-After. Так при медленном
+Postgres лишняя работа отбрасывается у входа, а не копится в очереди пула
+соединений, пока не истекут таймауты у всех.
+"""
+import asyncio
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+from fastapi import Depends, HTTPException, Request
+from db import DB_POOL_MAX
+
+# Общее число одновременно выполняемых запросов (по умолчанию — размер пула)
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", str(DB_POOL_MAX)))
+# Значение Retry-After (секунды) в ответе 503
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# Классы маршрутов в порядке приоритета
+READ = "read"
+WRITE = "write"
+SEARCH = "search"
+BULK = "bulk"
+EXPORT = "export"
+
+
+@dataclass
+class RouteClass:
+    name: str
+    priority: int
+    # Сколько запросов класса выполняется одновременно
+    max_concurrent: int
+    # Сколько запросов класса может ждать слот
+    max_queue: int
+    # Сколько секунд запрос ждёт слот, прежде чем получить 503
+    timeout: float
+    active: int = 0
+    waiters: deque = field(default_factory=deque)
+    admitted: int = 0
+    shed: int = 0
+    timeouts: int = 0
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": len(self.waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+        }
+
+
+def _route_class(name: str, priority: int, max_concurrent: int, max_queue: int, timeout: float) -> RouteClass:
+    prefix = f"ADMISSION_{name.upper()}"
+    return RouteClass(
+        name,
+        priority,
+        int(os.getenv(f"{prefix}_CONCURRENCY", str(max_concurrent))),
+        int(os.getenv(f"{prefix}_QUEUE", str(max_queue))),
+        float(os.getenv(f"{prefix}_TIMEOUT", str(timeout))),
+    )
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int, classes: list[RouteClass]):
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self.classes = {c.name: c for c in classes}
+        self._by_priority = sorted(classes, key=lambda c: c.priority)
+
+    def _wake(self) -> None:
+        """Раздаёт свободные слоты ожидающим, начиная с приоритетных классов."""
+        for route_class in self._by_priority:
+            while (
+                self.active < self.max_concurrent
+                and route_class.active < route_class.max_concurrent
+                and route_class.waiters
+            ):
+                future = route_class.waiters.popleft()
+                if future.done():
+                    # Ожидание уже отменено (таймаут или клиент ушёл)
+                    continue
+                self.active += 1
+                route_class.active += 1
+                future.set_result(None)
+
+    def release(self, route_class: RouteClass) -> None:
+        self.active -= 1
+        route_class.active -= 1
+        self._wake()
+
+    async def acquire(self, name: str) -> RouteClass:
+        """Ждёт слот класса `name`; Overloaded, если очередь полна или вышло время."""
+        route_class = self.classes[name]
+        future = asyncio.get_running_loop().create_future()
+        route_class.waiters.append(future)
+        self._wake()
+        if not future.done():
+            # Слот не выдан сразу: ждём, только если в очереди класса есть место
+            if len(route_class.waiters) > route_class.max_queue:
+                route_class.waiters.remove(future)
+                route_class.shed += 1
+                raise Overloaded()
+            try:
+                await asyncio.wait_for(future, route_class.timeout)
+            except BaseException as e:
+                if future.done() and not future.cancelled():
+                    # Слот выдан в момент отмены — возвращаем его
+                    self.release(route_class)
+                elif future in route_class.waiters:
+                    route_class.waiters.remove(future)
+                if isinstance(e, asyncio.TimeoutError):
+                    route_class.timeouts += 1
+                    raise Overloaded()
+                raise
+        route_class.admitted += 1
+        return route_class
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "classes": {name: c.stats() for name, c in self.classes.items()},
+        }
+
+
+admission = AdmissionController(
+    ADMISSION_MAX_CONCURRENT,
+    [
+        # Чтения по ключу и из кэша — быстрые и самые частые
+        _route_class(READ, 0, ADMISSION_MAX_CONCURRENT, 100, 1.0),
+        _route_class(WRITE, 1, ADMISSION_MAX_CONCURRENT, 50, 2.0),
+        # Полнотекстовый поиск и полные списки не должны занять все слоты
+        _route_class(SEARCH, 2, max(1, ADMISSION_MAX_CONCURRENT // 2), 20, 0.5),
+        # Массовые записи и импорт держат соединение долго
+        _route_class(BULK, 3, 1, 2, 5.0),
+        # Выгрузки держат соединение всё время передачи; отдельный класс, чтобы не занимать слот импорта
+        _route_class(EXPORT, 4, 2, 2, 1.0),
+    ],
+)
+
+
+def overloaded() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Сервер перегружен, повторите попытку позже",
+        headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+    )
+
+
+def admit(route_class: str | Callable[[Request], str]):
+    """Зависимость FastAPI: держит слот класса на время обработки запроса.
+
+    `route_class` — имя класса или функция (request) -> имя, если класс
+    зависит от параметров запроса.
+    """
+    async def dependency(request: Request):
+        name = route_class(request) if callable(route_class) else route_class
+        try:
+            slot = await admission.acquire(name)
+        except Overloaded:
+            raise overloaded()
+        try:
+            yield
+        finally:
+            admission.release(slot)
+    return Depends(dependency)
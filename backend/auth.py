@@ -0,0 +1,164 @@
+"""Подписанные токены доступа (HMAC-SHA256) без хранения сессий в БД.
+
+Формат токена: v1.<kid>.<payload>.<signature>, где payload — JSON в base64url
+({"sub": id пользователя, "typ": "access" | "refresh", "iat", "exp"}),
+а подпись — HMAC-SHA256 от "v1.<kid>.<payload>" ключом с идентификатором kid.
+
+Ключи задаются в AUTH_SIGNING_KEYS списком "kid:secret" через запятую. Первым
+ключом подписываются новые токены, остальные принимаются при проверке: для
+ротации новый ключ ставят первым, а старый удаляют, когда истекут выданные
+им refresh-токены.
+
+AuthMiddleware проверяет заголовок Authorization: Bearer <access-токен> и
+кладёт id пользователя в request.state.user_id. Обращения к Postgres нет.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from fastapi import HTTPException, Request
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger("uvicorn.error")
+
+# Время жизни токенов в секундах
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "900"))
+REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", str(30 * 24 * 3600)))
+# Токен служебных эндпоинтов (выгрузки) в заголовке X-Admin-Token; пусто — они отключены
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+
+_VERSION = "v1"
+
+
+class TokenError(Exception):
+    pass
+
+
+def _load_keys() -> list[tuple[str, bytes]]:
+    raw = os.getenv("AUTH_SIGNING_KEYS", "")
+    keys = []
+    for item in raw.split(","):
+        kid, sep, secret = item.strip().partition(":")
+        if sep and kid and secret:
+            keys.append((kid, secret.encode("utf-8")))
+    if not keys:
+        # Без общего ключа токены не переживут перезапуск и не подойдут другим воркерам
+        logger.warning("AUTH_SIGNING_KEYS is not set, using a random per-process signing key")
+        keys.append((secrets.token_hex(4), secrets.token_bytes(32)))
+    return keys
+
+
+_KEYS = _load_keys()
+_ACTIVE_KID, _ACTIVE_KEY = _KEYS[0]
+_KEYS_BY_ID = dict(_KEYS)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(key: bytes, message: bytes) -> bytes:
+    return _b64encode(hmac.new(key, message, hashlib.sha256).digest()).encode("ascii")
+
+
+def issue_token(user_id: int, token_type: str, ttl: int) -> str:
+    now = int(time.time())
+    payload = {"sub": user_id, "typ": token_type, "iat": now, "exp": now + ttl}
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    message = f"{_VERSION}.{_ACTIVE_KID}.{body}"
+    return f"{message}.{_sign(_ACTIVE_KEY, message.encode('ascii')).decode('ascii')}"
+
+
+def issue_tokens(user_id: int) -> dict:
+    """Пара access/refresh для ответа /auth/login, /auth/register и /auth/refresh."""
+    return {
+        "access_token": issue_token(user_id, "access", ACCESS_TOKEN_TTL),
+        "refresh_token": issue_token(user_id, "refresh", REFRESH_TOKEN_TTL),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL,
+    }
+
+
+def verify_token(token: str, token_type: str) -> int:
+    """Проверяет подпись, тип и срок действия; возвращает id пользователя."""
+    # Токен приходит от клиента как есть: всё, что не ASCII, — заведомо подделка
+    try:
+        raw = token.encode("ascii")
+        version, kid, body, signature = raw.split(b".")
+    except (UnicodeEncodeError, AttributeError, ValueError):
+        raise TokenError("malformed")
+    key = _KEYS_BY_ID.get(kid.decode("ascii"))
+    if version != _VERSION.encode("ascii") or key is None:
+        raise TokenError("unknown key")
+    if not hmac.compare_digest(_sign(key, b".".join((version, kid, body))), signature):
+        raise TokenError("bad signature")
+    try:
+        payload = json.loads(_b64decode(body.decode("ascii")))
+        user_id, typ, exp = payload["sub"], payload["typ"], payload["exp"]
+        expired = exp < time.time()
+    except (ValueError, KeyError, TypeError):
+        raise TokenError("malformed")
+    if typ != token_type:
+        raise TokenError("wrong type")
+    if expired:
+        raise TokenError("expired")
+    return user_id
+
+
+def current_user_id(request: Request) -> int | None:
+    return getattr(request.state, "user_id", None)
+
+
+def require_user(request: Request, user_id: int | None = None) -> int:
+    """id пользователя из токена; 401 без токена, 403 если он не совпадает с `user_id`."""
+    token_user = current_user_id(request)
+    if token_user is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Требуется авторизация",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if user_id is not None and user_id != token_user:
+        raise HTTPException(status_code=403, detail="Нет доступа к данным другого пользователя")
+    return token_user
+
+
+def require_admin(request: Request) -> None:
+    """403, если X-Admin-Token не совпадает с ADMIN_API_TOKEN (ролей пользователей пока нет)."""
+    token = request.headers.get("x-admin-token", "")
+    if not ADMIN_API_TOKEN or not hmac.compare_digest(token.encode("utf-8"), ADMIN_API_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Нет доступа")
+
+
+class AuthMiddleware:
+    """ASGI-middleware: проверяет Bearer-токен и выставляет request.state.user_id.
+
+    Запрос без токена или с недействительным токеном проходит дальше с
+    user_id = None — решение об отказе принимает эндпоинт (require_user).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            user_id = None
+            for name, value in scope["headers"]:
+                if name == b"authorization":
+                    scheme, _, token = value.decode("latin-1").partition(" ")
+                    if scheme.lower() == "bearer" and token:
+                        try:
+                            user_id = verify_token(token.strip(), "access")
+                        except TokenError:
+                            pass
+                    break
+            scope.setdefault("state", {})["user_id"] = user_id
+        await self.app(scope, receive, send)
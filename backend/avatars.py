@@ -0,0 +1,152 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import tempfile
+from pathlib import Path
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Каталог, где лежат файлы аватаров (в Docker — отдельный volume)
+AVATAR_DIR = Path(os.getenv("AVATAR_DIR", "data/avatars"))
+# Публичный префикс URL, который сохраняется в users.avatar_url (через nginx /api/)
+AVATAR_URL_PREFIX = os.getenv("AVATAR_URL_PREFIX", "/api/v1/avatars").rstrip("/")
+AVATAR_MAX_BYTES = 5 * 1024 * 1024  # 5 MB
+# Стороны квадратных миниатюр, которые генерируются при загрузке
+AVATAR_THUMB_SIZES = (64, 256)
+# Файл адресуется хешем содержимого и никогда не меняется
+AVATAR_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Обычная ссылка вместо data URL не должна тянуть за собой мегабайты
+AVATAR_MAX_URL_LENGTH = 2048
+
+_FORMATS = {
+    "PNG": ("png", "image/png"),
+    "JPEG": ("jpg", "image/jpeg"),
+    "GIF": ("gif", "image/gif"),
+    "WEBP": ("webp", "image/webp"),
+}
+_MEDIA_TYPES = {ext: media_type for ext, media_type in _FORMATS.values()}
+_NAME_RE = re.compile(r"^([0-9a-f]{64})(?:_(\d+))?\.(png|jpg|gif|webp)$")
+
+
+class AvatarError(ValueError):
+    """Некорректное изображение аватара; текст ошибки можно показать пользователю."""
+
+
+def is_data_url(value: str) -> bool:
+    return value.startswith("data:")
+
+
+def decode_data_url(data_url: str) -> bytes:
+    """Декодирует base64 data URL, отсекая слишком большие ещё до декодирования."""
+    header, _, b64 = data_url.partition(",")
+    if not header.startswith("data:") or not header.endswith(";base64") or not b64:
+        raise AvatarError("Неверный формат изображения")
+    # 4 символа base64 кодируют 3 байта — размер известен без декодирования
+    if (len(b64) // 4) * 3 > AVATAR_MAX_BYTES + 3:
+        raise AvatarError("Размер аватара не должен превышать 5MB")
+    try:
+        data = base64.b64decode(b64, validate=True)
+    except binascii.Error:
+        raise AvatarError("Неверный формат изображения")
+    if len(data) > AVATAR_MAX_BYTES:
+        raise AvatarError("Размер аватара не должен превышать 5MB")
+    return data
+
+
+def _path(name: str) -> Path:
+    return AVATAR_DIR / name[:2] / name
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _thumbnail(data: bytes, size: int) -> bytes:
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        img = ImageOps.fit(img.convert("RGBA"), (size, size))
+        out = io.BytesIO()
+        img.save(out, format="WEBP", quality=85)
+        return out.getvalue()
+
+
+def save_avatar(data: bytes) -> str:
+    """Сохраняет изображение и его миниатюры на диск, возвращает URL оригинала.
+
+    Синхронная функция (CPU и диск) — из обработчиков вызывать через asyncio.to_thread.
+    Одинаковые файлы хранятся один раз: имя файла — sha256 содержимого.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            image_format = img.format
+            if image_format not in _FORMATS:
+                raise AvatarError("Поддерживаются только PNG, JPEG, GIF и WEBP")
+            # verify() не декодирует пиксели JPEG, поэтому обрезанный файл
+            # проверяем полным декодированием
+            img.load()
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        if isinstance(e, AvatarError):
+            raise
+        raise AvatarError("Неверный формат изображения")
+
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"{digest}.{_FORMATS[image_format][0]}"
+    path = _path(name)
+    if not path.exists():
+        # Миниатюры пишем раньше оригинала: наличие оригинала означает, что всё готово
+        for size in AVATAR_THUMB_SIZES:
+            try:
+                thumbnail = _thumbnail(data, size)
+            except (OSError, ValueError, Image.DecompressionBombError):
+                raise AvatarError("Неверный формат изображения")
+            _write_atomic(_path(f"{digest}_{size}.webp"), thumbnail)
+        _write_atomic(path, data)
+    return f"{AVATAR_URL_PREFIX}/{name}"
+
+
+def find_avatar(name: str) -> tuple[Path, str, str] | None:
+    """Возвращает (путь, media type, ETag) файла аватара или None, если его нет."""
+    match = _NAME_RE.match(name)
+    if not match:
+        return None
+    path = _path(name)
+    if not path.is_file():
+        return None
+    etag = f'"{name.rsplit(".", 1)[0]}"'
+    return path, _MEDIA_TYPES[match.group(3)], etag
+
+
+async def migrate_inline_avatars(cur, batch_size: int = 20) -> int:
+    """Переносит старые base64-аватары из users.avatar_url в файловое хранилище.
+
+    Возвращает число перенесённых аватаров. Некорректные изображения обнуляются.
+    """
+    migrated = 0
+    last_id = 0
+    while True:
+        await cur.execute(
+            "SELECT id, avatar_url FROM users WHERE id > %s AND avatar_url LIKE 'data:%%' ORDER BY id LIMIT %s",
+            (last_id, batch_size),
+        )
+        rows = await cur.fetchall()
+        if not rows:
+            return migrated
+        for user_id, data_url in rows:
+            last_id = user_id
+            try:
+                url = await asyncio.to_thread(save_avatar, decode_data_url(data_url))
+            except AvatarError:
+                url = None
+            await cur.execute("UPDATE users SET avatar_url = %s WHERE id = %s", (url, user_id))
+            migrated += 1
@@ -0,0 +1,284 @@
+"""Нагрузочный прогон по основным эндпоинтам с отчётом в JSON.
+
+Запуск из каталога backend при запущенном приложении и БД, наполненной bench.seed
+(с тем же AUTH_SIGNING_KEYS, что у сервера: токены пользователей подписываются здесь):
+
+    python -m bench.load --base-url http://localhost:8000 --concurrency 1,10,50 \\
+        --duration 10 --output results.json
+    python -m bench.load ... --baseline results.json --output new.json
+
+Каждый эндпоинт нагружается отдельно на каждом уровне конкурентности в течение
+--duration секунд. Для каждого замера в отчёте: число запросов и ошибок,
+пропускная способность, задержки p50/p95/p99, число запросов к БД на один
+HTTP-запрос. Число запросов к БД берётся из разницы pg_stat_statements до и
+после замера. Для этого Postgres запускается с
+shared_preload_libraries=pg_stat_statements, а в базе выполняется
+CREATE EXTENSION pg_stat_statements; без расширения поле равно null. Учитываются все запросы к базе, включая фоновые задачи
+приложения.
+
+С --baseline в отчёт добавляется сравнение с прошлым прогоном: изменение
+каждой метрики в процентах для совпадающих пар (эндпоинт, конкурентность).
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from auth import issue_token
+from bench.seed import BENCH_PASSWORD, LEVELS, TOPICS
+from db import close_pool, get_connection, open_pool
+
+_QUERY_COUNT = """
+    SELECT coalesce(sum(calls), 0)::bigint FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+"""
+
+# Метрики, которые сравниваются с baseline
+_COMPARED = ("p50", "p95", "p99", "throughput_rps", "db_queries_per_request")
+
+
+class Dataset:
+    """Диапазоны id пользователей и курсов, из которых выбираются параметры запросов."""
+
+    def __init__(self, user_ids: tuple[int, int], course_ids: tuple[int, int], sizes: dict):
+        self.user_ids = user_ids
+        self.course_ids = course_ids
+        self.sizes = sizes
+
+    def user(self, rng: random.Random) -> int:
+        return rng.randint(*self.user_ids)
+
+    def course(self, rng: random.Random) -> int:
+        return rng.randint(*self.course_ids)
+
+
+def _auth(user_id: int) -> dict:
+    # Токен подписываем сами, без логина: нужен тот же AUTH_SIGNING_KEYS, что у сервера
+    return {"Authorization": f"Bearer {issue_token(user_id, 'access', 3600)}"}
+
+
+# Генераторы запросов: (ds, rng) -> (метод, путь, query-параметры, JSON-тело, заголовки)
+def _courses(ds, rng):
+    return "GET", "/v1/courses", None, None, None
+
+
+def _search(ds, rng):
+    return "GET", "/v1/courses", {"q": f"{rng.choice(TOPICS)} {rng.choice(LEVELS).split()[-1]}"}, None, None
+
+
+def _course(ds, rng):
+    return "GET", f"/v1/course/{ds.course(rng)}", None, None, None
+
+
+def _user_courses(ds, rng):
+    user_id = ds.user(rng)
+    return "GET", f"/v1/users/{user_id}/courses", None, None, _auth(user_id)
+
+
+def _enroll(ds, rng):
+    return "POST", "/v1/enroll", None, {"course_id": ds.course(rng)}, _auth(ds.user(rng))
+
+
+def _login(ds, rng):
+    return "POST", "/auth/login", None, {"login": f"bench_user_{ds.user(rng)}", "password": BENCH_PASSWORD}, None
+
+
+ENDPOINTS = {
+    "courses": _courses,
+    "search": _search,
+    "course": _course,
+    "user_courses": _user_courses,
+    "enroll": _enroll,
+    "login": _login,
+}
+
+
+async def load_dataset() -> Dataset:
+    async with get_connection() as conn:
+        cur = await conn.execute("SELECT min(id), max(id) FROM users WHERE username LIKE 'bench\\_user\\_%%'")
+        user_ids = await cur.fetchone()
+        cur = await conn.execute("SELECT min(id), max(id) FROM courses")
+        course_ids = await cur.fetchone()
+        # Оценка размеров из статистики планировщика: count(*) по 2M строк дорог
+        cur = await conn.execute(
+            """
+            SELECT relname, reltuples::bigint FROM pg_class
+            WHERE relname IN ('users', 'courses', 'questions', 'answers', 'user_courses')
+            """
+        )
+        sizes = dict(await cur.fetchall())
+    if user_ids[0] is None or course_ids[0] is None:
+        raise SystemExit("Нет тестовых данных: сначала запустите python -m bench.seed")
+    return Dataset(user_ids, course_ids, sizes)
+
+
+async def query_count() -> int | None:
+    try:
+        async with get_connection() as conn:
+            cur = await conn.execute(_QUERY_COUNT)
+            return (await cur.fetchone())[0]
+    except Exception:
+        return None
+
+
+def percentile(sorted_values: list[float], p: float) -> float | None:
+    """Перцентиль методом ближайшего ранга."""
+    if not sorted_values:
+        return None
+    rank = max(1, round(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_one(client: httpx.AsyncClient, ds: Dataset, name: str, concurrency: int,
+                  duration: float, seed: int) -> dict:
+    make_request = ENDPOINTS[name]
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id: int) -> None:
+        nonlocal errors
+        rng = random.Random(f"{seed}-{name}-{concurrency}-{worker_id}")
+        while time.perf_counter() < deadline:
+            method, path, params, body, headers = make_request(ds, rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params, json=body, headers=headers)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += failed
+
+    queries_before = await query_count()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    queries_after = await query_count()
+
+    latencies.sort()
+    requests = len(latencies)
+    db_queries = None
+    if queries_before is not None and queries_after is not None:
+        # Минус запрос самого замера
+        db_queries = max(0, queries_after - queries_before - 1)
+    return {
+        "endpoint": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "error_rate": round(errors / requests, 4) if requests else None,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50": _round(percentile(latencies, 50)),
+        "p95": _round(percentile(latencies, 95)),
+        "p99": _round(percentile(latencies, 99)),
+        "max": _round(latencies[-1] if latencies else None),
+        "db_queries": db_queries,
+        "db_queries_per_request": round(db_queries / requests, 2) if db_queries is not None and requests else None,
+    }
+
+
+def _round(value: float | None) -> float | None:
+    return round(value, 2) if value is not None else None
+
+
+def compare(results: list[dict], baseline: dict) -> list[dict]:
+    """Изменение метрик относительно baseline в процентах (+ — больше, чем было)."""
+    previous = {(r["endpoint"], r["concurrency"]): r for r in baseline.get("results", [])}
+    out = []
+    for result in results:
+        old = previous.get((result["endpoint"], result["concurrency"]))
+        if old is None:
+            continue
+        change = {}
+        for metric in _COMPARED:
+            before, after = old.get(metric), result.get(metric)
+            if before and after is not None:
+                change[metric] = round((after - before) / before * 100, 1)
+        out.append({"endpoint": result["endpoint"], "concurrency": result["concurrency"], "change_pct": change})
+    return out
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _main(args) -> dict:
+    await open_pool()
+    try:
+        ds = await load_dataset()
+        concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+        endpoints = args.endpoints.split(",") if args.endpoints else list(ENDPOINTS)
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise SystemExit(f"Неизвестные эндпоинты: {', '.join(sorted(unknown))}")
+        limits = httpx.Limits(max_connections=max(concurrency_levels), max_keepalive_connections=max(concurrency_levels))
+        results = []
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+            for name in endpoints:
+                for concurrency in concurrency_levels:
+                    if args.warmup:
+                        await run_one(client, ds, name, concurrency, args.warmup, args.seed + 1)
+                    result = await run_one(client, ds, name, concurrency, args.duration, args.seed)
+                    print(
+                        f"{name:>14} c={concurrency:<4} {result['throughput_rps']:>9} rps  "
+                        f"p50={result['p50']}ms p95={result['p95']}ms p99={result['p99']}ms  "
+                        f"errors={result['errors']} db/req={result['db_queries_per_request']}",
+                        file=sys.stderr,
+                    )
+                    results.append(result)
+    finally:
+        await close_pool()
+
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "base_url": args.base_url,
+            "duration": args.duration,
+            "seed": args.seed,
+            "dataset": ds.sizes,
+        },
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["comparison"] = compare(results, json.load(f))
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", default="1,10,50", help="уровни конкурентности через запятую")
+    parser.add_argument("--duration", type=float, default=10, help="секунд на один замер")
+    parser.add_argument("--warmup", type=float, default=1, help="секунд прогрева перед замером (0 — без прогрева)")
+    parser.add_argument("--endpoints", help=f"через запятую из: {', '.join(ENDPOINTS)}")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--output", help="куда записать JSON (по умолчанию — stdout)")
+    args = parser.parse_args()
+
+    report = asyncio.run(_main(args))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
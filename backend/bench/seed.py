@@ -0,0 +1,182 @@
+"""Наполнение БД синтетическими данными для нагрузочных тестов.
+
+Запуск из каталога backend (подключение — те же POSTGRES_* переменные, что у приложения):
+
+    python -m bench.seed --reset
+    python -m bench.seed --reset --scale 0.01   # 1% от полного объёма, для быстрой проверки
+
+По умолчанию: 100k пользователей, 50k курсов, 2M ответов (по 4 на вопрос),
+1M записей на курсы. Данные генерируются на стороне Postgres через
+generate_series и детерминированы: одинаковые параметры дают одинаковую БД.
+Пользователи называются bench_user_<n>, пароль у всех — BENCH_PASSWORD, уже
+в виде хэша scrypt: первый вход не идёт по пути перехэширования старого пароля.
+
+--reset очищает users, courses и все зависимые таблицы (TRUNCATE ... CASCADE),
+поэтому id идут подряд с 1. Не запускайте его на рабочей базе.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from db import close_pool, get_connection, open_pool
+from migrations import run_migrations
+from passwords import hash_password
+
+BENCH_PASSWORD = "bench-password"
+ANSWERS_PER_QUESTION = 4
+
+# Слова для названий и описаний: по ним bench.load строит поисковые запросы
+TOPICS = ["Python", "SQL", "JavaScript", "Go", "Rust", "Docker", "Linux", "Алгоритмы",
+          "Статистика", "Машинное обучение", "Веб-разработка", "Базы данных"]
+LEVELS = ["для начинающих", "продвинутый курс", "практикум", "интенсив",
+          "с нуля", "для профессионалов", "в задачах", "подготовка к собеседованию"]
+
+_SEED_USERS = """
+    INSERT INTO users (username, email, password)
+    SELECT 'bench_user_' || g, 'bench_user_' || g || '@example.com', %(password)s
+    FROM generate_series(1, %(count)s) g
+    ON CONFLICT DO NOTHING
+"""
+
+
+def _scaled(value: int, scale: float) -> int:
+    return max(1, int(value * scale))
+
+
+async def seed(users: int, courses: int, answers: int, enrollments: int, reset: bool) -> dict:
+    questions_per_course = max(1, round(answers / ANSWERS_PER_QUESTION / courses))
+    enrollments_per_user = max(1, round(enrollments / users))
+    timings = {}
+
+    async with get_connection() as conn:
+        if reset:
+            await conn.execute("TRUNCATE users, courses RESTART IDENTITY CASCADE")
+        cur = await conn.execute("SELECT coalesce(max(id), 0) FROM courses")
+        first_course = (await cur.fetchone())[0] + 1
+        cur = await conn.execute("SELECT coalesce(max(id), 0) FROM questions")
+        first_question = (await cur.fetchone())[0] + 1
+
+        started = time.perf_counter()
+        # Один хэш (и одна соль) на всех: scrypt для каждой строки занял бы минуты
+        await conn.execute(_SEED_USERS, {"password": hash_password(BENCH_PASSWORD), "count": users})
+        timings["users"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await conn.execute(
+            """
+            INSERT INTO courses (title, description, price)
+            SELECT t.topics[1 + g %% cardinality(t.topics)] || ' ' || t.levels[1 + (g / cardinality(t.topics)) %% cardinality(t.levels)] || ' #' || g,
+                   'Курс «' || t.topics[1 + g %% cardinality(t.topics)] || '»: теория, практика и тесты. Выпуск ' || g,
+                   CASE WHEN g %% 3 = 0 THEN 0 ELSE (g * 37) %% 5000 END
+            FROM generate_series(1, %(count)s) g, (SELECT %(topics)s::text[] AS topics, %(levels)s::text[] AS levels) t
+            ORDER BY g
+            """,
+            {"count": courses, "topics": TOPICS, "levels": LEVELS},
+        )
+        await conn.execute(
+            """
+            INSERT INTO course_stats (course_id, total_lessons)
+            SELECT id, %s FROM courses WHERE id >= %s
+            """,
+            (questions_per_course, first_course),
+        )
+        timings["courses"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await conn.execute(
+            """
+            INSERT INTO questions (course_id, text)
+            SELECT c.id, 'Вопрос ' || q || ' курса ' || c.id
+            FROM courses c, generate_series(1, %s) q
+            WHERE c.id >= %s
+            ORDER BY c.id, q
+            """,
+            (questions_per_course, first_course),
+        )
+        await conn.execute(
+            """
+            INSERT INTO answers (question_id, text, is_correct)
+            SELECT q.id, 'Вариант ' || a, a = 1 + q.id %% %s
+            FROM questions q, generate_series(1, %s) a
+            WHERE q.id >= %s
+            ORDER BY q.id, a
+            """,
+            (ANSWERS_PER_QUESTION, ANSWERS_PER_QUESTION, first_question),
+        )
+        timings["questions_answers"] = time.perf_counter() - started
+
+        # Курсы распределены по пользователям мультипликативным хэшем: набор
+        # стабилен между запусками, а популярность курсов неравномерна.
+        started = time.perf_counter()
+        cur = await conn.execute(
+            """
+            WITH bench_users AS (
+                SELECT id FROM users WHERE username LIKE 'bench\\_user\\_%%'
+            ), inserted AS (
+                INSERT INTO user_courses (user_id, course_id)
+                SELECT u.id, %(first)s + ((u.id::bigint * 2654435761 + k::bigint * k * 40503) %% %(courses)s)::int
+                FROM bench_users u, generate_series(1, %(per_user)s) k
+                ON CONFLICT DO NOTHING
+                RETURNING course_id
+            ), counts AS (
+                SELECT course_id, count(*) AS added FROM inserted GROUP BY course_id
+            ), bumped AS (
+                UPDATE course_stats s SET students_count = s.students_count + c.added
+                FROM counts c WHERE s.course_id = c.course_id
+            )
+            SELECT coalesce(sum(added), 0)::int FROM counts
+            """,
+            {"first": first_course, "courses": courses, "per_user": enrollments_per_user},
+        )
+        enrolled = (await cur.fetchone())[0]
+        timings["enrollments"] = time.perf_counter() - started
+
+    # Обновляем статистику планировщика уже после коммита данных
+    async with get_connection() as conn:
+        started = time.perf_counter()
+        await conn.execute("ANALYZE")
+        timings["analyze"] = time.perf_counter() - started
+
+    return {
+        "users": users,
+        "courses": courses,
+        "questions": courses * questions_per_course,
+        "answers": courses * questions_per_course * ANSWERS_PER_QUESTION,
+        "enrollments": enrolled,
+        "seconds": {k: round(v, 2) for k, v in timings.items()},
+    }
+
+
+async def _main(args) -> None:
+    await open_pool()
+    try:
+        await run_migrations()
+        report = await seed(
+            users=_scaled(args.users, args.scale),
+            courses=_scaled(args.courses, args.scale),
+            answers=_scaled(args.answers, args.scale),
+            enrollments=_scaled(args.enrollments, args.scale),
+            reset=args.reset,
+        )
+    finally:
+        await close_pool()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--courses", type=int, default=50_000)
+    parser.add_argument("--answers", type=int, default=2_000_000)
+    parser.add_argument("--enrollments", type=int, default=1_000_000)
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель для всех объёмов")
+    parser.add_argument("--reset", action="store_true", help="очистить таблицы перед наполнением")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Сравнение CPU на сериализацию списка курсов: стандартный путь FastAPI и orjson.
+
+Запуск из каталога backend:
+
+    python -m bench.serialization --courses 10000 --repeat 20
+
+Стандартный путь — то, что FastAPI делает с dict-ами из обработчика:
+валидация через response_model, jsonable_encoder и JSONResponse (json.dumps).
+Быстрый путь — fast_json: orjson без повторной валидации. Меряется процессорное
+время (time.process_time) на один запрос, БД не нужна.
+"""
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from main import Course, _catalog_course
+from serialization import fast_json
+
+
+def make_courses(count: int) -> list[dict]:
+    """Элементы каталога в том виде, в каком их собирает _catalog_course."""
+    return [
+        _catalog_course((i, f"Курс {i}: основы программирования", f"Описание курса номер {i}. " * 4, i % 5000, i % 977, i % 40))
+        for i in range(1, count + 1)
+    ]
+
+
+def measure(fn, repeat: int) -> float:
+    """Среднее процессорное время одного вызова, мс."""
+    fn()  # прогрев
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--courses", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    courses = make_courses(args.courses)
+    adapter = TypeAdapter(list[Course])
+
+    def standard():
+        validated = adapter.validate_python(courses)
+        return JSONResponse(jsonable_encoder(validated)).body
+
+    def standard_no_model():
+        return JSONResponse(jsonable_encoder(courses)).body
+
+    def fast():
+        return fast_json(courses).body
+
+    results = {
+        "courses": args.courses,
+        "response_model_json_ms": round(measure(standard, args.repeat), 2),
+        "jsonable_encoder_json_ms": round(measure(standard_no_model, args.repeat), 2),
+        "orjson_ms": round(measure(fast, args.repeat), 2),
+    }
+    results["cpu_saved_ms"] = round(results["response_model_json_ms"] - results["orjson_ms"], 2)
+    results["speedup"] = round(results["response_model_json_ms"] / max(results["orjson_ms"], 1e-6), 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
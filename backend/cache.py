@@ -0,0 +1,114 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+# Параметры кэша деталей курса (GET /v1/course/{id})
+COURSE_CACHE_SIZE = int(os.getenv("COURSE_CACHE_SIZE", "1000"))
+COURSE_CACHE_TTL = float(os.getenv("COURSE_CACHE_TTL", "300"))
+
+
+class AsyncLRUCache:
+    """Ограниченный LRU-кэш с TTL и single-flight загрузкой.
+
+    Значения хранятся как есть (для курсов — уже сериализованный JSON). Если несколько запросов
+    одновременно промахиваются по одному ключу, загрузчик вызывается один раз,
+    а остальные ждут его результат.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, bytes]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        # Поколение ключа растёт при инвалидации: результат загрузки, начатой
+        # до инвалидации, не попадает в кэш.
+        self._generations: dict[Hashable, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: bytes) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._inflight.clear()
+        self._generations.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[bytes]]) -> bytes:
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        while (future := self._inflight.get(key)) is not None:
+            # Кто-то уже загружает этот ключ — ждём его результата
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Отменили загружавший запрос (например, клиент ушёл), а не нас:
+                # загружаем сами или ждём того, кто начал загрузку раньше
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        # Ошибку загрузки забирают ожидающие; если их нет, не пишем в лог
+        # "Future exception was never retrieved".
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        generation = self._generations.get(key, 0)
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            # Ожидающие увидят отмену и повторят загрузку сами
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        if self._generations.get(key, 0) == generation:
+            self.set(key, value)
+        future.set_result(value)
+        return value
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+course_cache = AsyncLRUCache(COURSE_CACHE_SIZE, COURSE_CACHE_TTL)
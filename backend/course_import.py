@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import AsyncIterable, AsyncIterator
+from pydantic import ValidationError
+import events
+from course_store import count_rows, insert_courses
+from db import close_pool, get_connection, open_pool
+
+logger = logging.getLogger("uvicorn.error")
+
+# Сколько курсов записываем в одной транзакции
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Разбивает поток байтов (например, тело запроса) на строки.
+
+    Строки не декодируются: неверный UTF-8 — ошибка одной строки в
+    import_course_lines, а не всего запроса.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def import_course_lines(lines: AsyncIterable[str | bytes], model, chunk_size: int = IMPORT_CHUNK_SIZE, on_chunk=None) -> dict:
+    """Импортирует курсы из JSONL: одна строка — один объект схемы `model` (CourseCreate).
+
+    Курсы пишутся пачками по `chunk_size`, каждая пачка — в своей транзакции.
+    Ошибка разбора строки пропускает только эту строку, ошибка записи —
+    только свою пачку; всё это попадает в `errors` отчёта.
+    """
+    report = {
+        "courses": 0,
+        "rows": 0,
+        "chunks": 0,
+        "failed_chunks": 0,
+        "errors": [],
+        "course_ids": [],
+    }
+    started = time.monotonic()
+    chunk = []
+    chunk_lines = []
+
+    async def flush():
+        report["chunks"] += 1
+        try:
+            async with get_connection() as conn, conn.cursor() as cur:
+                course_ids = await insert_courses(cur, chunk)
+                # Кэши воркеров сбрасываются после коммита пачки (в т.ч. при импорте из CLI)
+                await events.publish(cur, events.COURSE, course_ids)
+                await events.publish(cur, events.CATALOG)
+        except Exception as e:
+            logger.exception("Failed to import course chunk")
+            report["failed_chunks"] += 1
+            report["errors"].append({
+                "chunk": report["chunks"],
+                "lines": [chunk_lines[0], chunk_lines[-1]],
+                "error": str(e),
+            })
+        else:
+            report["courses"] += len(course_ids)
+            report["rows"] += count_rows(chunk)
+            report["course_ids"].extend(course_ids)
+        if on_chunk:
+            on_chunk(report)
+        chunk.clear()
+        chunk_lines.clear()
+
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        try:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            if not line.strip():
+                continue
+            chunk.append(model.model_validate_json(line))
+        except (UnicodeDecodeError, ValidationError) as e:
+            report["errors"].append({"line": line_no, "error": str(e)})
+            continue
+        chunk_lines.append(line_no)
+        if len(chunk) >= chunk_size:
+            await flush()
+    if chunk:
+        await flush()
+
+    elapsed = time.monotonic() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows"] / elapsed, 1) if elapsed > 0 else None
+    return report
+
+
+async def _file_lines(path: str) -> AsyncIterator[str]:
+    with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as f:
+        for line in f:
+            yield line
+
+
+async def _main(args) -> int:
+    from main import CourseCreate
+
+    def progress(report):
+        print(
+            f"chunk {report['chunks']}: {report['courses']} courses, {report['rows']} rows",
+            file=sys.stderr,
+        )
+
+    await open_pool()
+    try:
+        report = await import_course_lines(_file_lines(args.path), CourseCreate, args.chunk_size, progress)
+    finally:
+        await close_pool()
+    report.pop("course_ids")
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Импорт курсов из JSONL (одна строка — один CourseCreate)")
+    parser.add_argument("path", help="путь к .jsonl файлу или '-' для stdin")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="курсов в одной транзакции")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
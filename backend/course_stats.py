@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+import events
+from db import get_connection
+
+logger = logging.getLogger("uvicorn.error")
+
+# Как часто сверять счётчики course_stats с реальными данными (0 — не сверять)
+COURSE_STATS_RECONCILE_INTERVAL = float(os.getenv("COURSE_STATS_RECONCILE_INTERVAL", "3600"))
+# Сколько курсов пересчитывать одним запросом при сверке
+COURSE_STATS_RECONCILE_BATCH = int(os.getenv("COURSE_STATS_RECONCILE_BATCH", "1000"))
+# Максимум пар (пользователь, курс) в одном запросе массовой записи
+BULK_ENROLL_MAX_PAIRS = int(os.getenv("BULK_ENROLL_MAX_PAIRS", "100000"))
+# Ключ advisory lock: сверку одновременно выполняет только один воркер
+_RECONCILE_LOCK_KEY = 0x5354_4154  # 'STAT'
+
+CREATE_COURSE_STATS_TABLE = """
+    CREATE TABLE IF NOT EXISTS course_stats (
+        course_id INTEGER PRIMARY KEY REFERENCES courses(id) ON DELETE CASCADE,
+        students_count INTEGER NOT NULL DEFAULT 0,
+        total_lessons INTEGER NOT NULL DEFAULT 0
+    );
+"""
+
+# Записывает пользователей на курсы (пары из двух массивов) и в той же транзакции
+# увеличивает students_count только для реально вставленных строк.
+ENROLL_QUERY = """
+    WITH inserted AS (
+        INSERT INTO user_courses (user_id, course_id)
+        SELECT * FROM unnest(%s::int[], %s::int[])
+        ON CONFLICT DO NOTHING
+        RETURNING course_id
+    ), counts AS (
+        SELECT course_id, count(*) AS added FROM inserted GROUP BY course_id
+    ), bumped AS (
+        INSERT INTO course_stats (course_id, students_count)
+        SELECT course_id, added FROM counts
+        ON CONFLICT (course_id) DO UPDATE
+            SET students_count = course_stats.students_count + EXCLUDED.students_count
+    )
+    SELECT coalesce(sum(added), 0)::int FROM counts
+"""
+
+# Строки счётчиков пачки создаются (если их нет) и блокируются до пересчёта.
+# Иначе запись на курс, закоммиченная, пока пересчёт ждёт блокировку строки,
+# затиралась бы числом из снимка, взятого до неё. После блокировки следующий
+# запрос берёт новый снимок (READ COMMITTED), а новые записи ждут коммита сверки.
+_RECONCILE_LOCK_ROWS = (
+    """
+    INSERT INTO course_stats (course_id)
+    SELECT id FROM courses WHERE id > %s AND id <= %s ORDER BY id
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    SELECT course_id FROM course_stats
+    WHERE course_id > %s AND course_id <= %s
+    ORDER BY course_id
+    FOR UPDATE
+    """,
+)
+
+_RECONCILE_QUERY = """
+    INSERT INTO course_stats (course_id, students_count, total_lessons)
+    SELECT c.id,
+           (SELECT count(*) FROM user_courses uc WHERE uc.course_id = c.id),
+           (SELECT count(*) FROM questions q WHERE q.course_id = c.id)
+    FROM courses c
+    WHERE c.id > %s AND c.id <= %s
+    ON CONFLICT (course_id) DO UPDATE
+        SET students_count = EXCLUDED.students_count,
+            total_lessons = EXCLUDED.total_lessons
+        WHERE (course_stats.students_count, course_stats.total_lessons)
+              IS DISTINCT FROM (EXCLUDED.students_count, EXCLUDED.total_lessons)
+"""
+
+
+async def reconcile_course_stats() -> int | None:
+    """Пересчитывает счётчики по реальным данным и исправляет расхождения.
+
+    Идёт по курсам диапазонами id, каждый диапазон — отдельная короткая
+    транзакция. Возвращает число исправленных строк или None, если сверку
+    уже выполняет другой воркер.
+    """
+    async with get_connection() as conn:
+        cur = await conn.execute("SELECT pg_try_advisory_lock(%s)", (_RECONCILE_LOCK_KEY,))
+        locked = (await cur.fetchone())[0]
+        await conn.commit()
+        if not locked:
+            return None
+        try:
+            fixed = 0
+            cur = await conn.execute("SELECT coalesce(max(id), 0) FROM courses")
+            max_id = (await cur.fetchone())[0]
+            await conn.commit()
+            for low in range(0, max_id, COURSE_STATS_RECONCILE_BATCH):
+                bounds = (low, low + COURSE_STATS_RECONCILE_BATCH)
+                for query in _RECONCILE_LOCK_ROWS:
+                    await conn.execute(query, bounds)
+                cur = await conn.execute(_RECONCILE_QUERY, bounds)
+                fixed += cur.rowcount
+                await conn.commit()
+            if fixed:
+                # Счётчики входят в ответы каталога других воркеров
+                await events.publish(conn, events.CATALOG)
+                await conn.commit()
+            return fixed
+        finally:
+            # Блокировка сессионная: снимаем её явно, даже если пачка упала
+            await conn.rollback()
+            await conn.execute("SELECT pg_advisory_unlock(%s)", (_RECONCILE_LOCK_KEY,))
+            await conn.commit()
+
+
+async def run_reconcile_loop() -> None:
+    """Фоновая задача: сверка при старте и затем раз в COURSE_STATS_RECONCILE_INTERVAL секунд."""
+    while True:
+        try:
+            fixed = await reconcile_course_stats()
+            if fixed:
+                # Счётчики входят в ответы каталога — сбрасываем его ETag
+                events.dispatch(events.CATALOG)
+                logger.info(f"course_stats reconciled: {fixed} rows corrected")
+        except Exception:
+            logger.exception("Failed to reconcile course_stats")
+        await asyncio.sleep(COURSE_STATS_RECONCILE_INTERVAL)
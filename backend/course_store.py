@@ -0,0 +1,94 @@
+"""Пакетная запись курсов с вопросами и ответами.
+
+Любое количество курсов записывается четырьмя запросами: по одному INSERT ... SELECT
+FROM unnest(...) на таблицы courses, course_stats, questions и answers.
+"""
+
+
+async def _insert_returning_ids(cur, query: str, params: tuple) -> list[int]:
+    await cur.execute(query, params)
+    # Строки вставляются в порядке ORDINALITY, а SERIAL растёт в порядке вставки,
+    # поэтому отсортированные id соответствуют порядку входных массивов.
+    return sorted(row[0] for row in await cur.fetchall())
+
+
+async def insert_courses(cur, courses: list) -> list[int]:
+    """Вставляет курсы (объекты вида CourseCreate) и возвращает их id по порядку.
+
+    Транзакцией управляет вызывающий код.
+    """
+    if not courses:
+        return []
+
+    course_ids = await _insert_returning_ids(
+        cur,
+        """
+        INSERT INTO courses (title, description, price)
+        SELECT t.title, t.description, t.price
+        FROM unnest(%s::text[], %s::text[], %s::int[]) WITH ORDINALITY AS t(title, description, price, ord)
+        ORDER BY t.ord
+        RETURNING id
+        """,
+        (
+            [c.title for c in courses],
+            [c.description for c in courses],
+            [c.price for c in courses],
+        ),
+    )
+
+    question_course_ids = []
+    question_texts = []
+    question_answers = []
+    for course_id, course in zip(course_ids, courses):
+        for question in course.questions:
+            question_course_ids.append(course_id)
+            question_texts.append(question.text)
+            question_answers.append(question.answers)
+
+    # Счётчики course_stats заводим сразу: число уроков известно при создании
+    await cur.execute(
+        "INSERT INTO course_stats (course_id, total_lessons) SELECT * FROM unnest(%s::int[], %s::int[])",
+        (course_ids, [len(c.questions) for c in courses]),
+    )
+
+    if not question_texts:
+        return course_ids
+
+    question_ids = await _insert_returning_ids(
+        cur,
+        """
+        INSERT INTO questions (course_id, text)
+        SELECT t.course_id, t.text
+        FROM unnest(%s::int[], %s::text[]) WITH ORDINALITY AS t(course_id, text, ord)
+        ORDER BY t.ord
+        RETURNING id
+        """,
+        (question_course_ids, question_texts),
+    )
+
+    answer_question_ids = []
+    answer_texts = []
+    answer_flags = []
+    for question_id, answers in zip(question_ids, question_answers):
+        for answer in answers:
+            answer_question_ids.append(question_id)
+            answer_texts.append(answer.text)
+            answer_flags.append(answer.is_correct)
+    if answer_texts:
+        await cur.execute(
+            """
+            INSERT INTO answers (question_id, text, is_correct)
+            SELECT * FROM unnest(%s::int[], %s::text[], %s::bool[])
+            """,
+            (answer_question_ids, answer_texts, answer_flags),
+        )
+    return course_ids
+
+
+def count_rows(courses: list) -> int:
+    """Сколько строк (курсы + вопросы + ответы) займут курсы в БД."""
+    total = 0
+    for course in courses:
+        total += 1 + len(course.questions)
+        total += sum(len(q.answers) for q in course.questions)
+    return total
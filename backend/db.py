@@ -1,7 +1,14 @@
+import asyncio
+import itertools
+import logging
 import os
 import time
-import psycopg2
-from contextlib import contextmanager
+from contextlib import asynccontextmanager
+from typing import Hashable
+from psycopg import AsyncConnection, OperationalError
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from metrics import TimedCursor, metrics
 
 # Получаем данные для подключения к БД из переменных окружения
 DB_NAME = os.getenv("POSTGRES_DB", "Stepik")
@@ -10,38 +17,249 @@ DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "1234")
 DB_HOST = os.getenv("POSTGRES_HOST", "localhost") # 'db' - это имя сервиса PostgreSQL в Docker Compose
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 
-def get_connection():
-    """Устанавливает и возвращает соединение с базой данных PostgreSQL."""
-    # Попытки подключения с экспоненциальной/фиксированной паузой.
-    retries = int(os.getenv("DB_CONN_RETRIES", "10"))
-    wait_seconds = float(os.getenv("DB_CONN_WAIT", "1"))
+# Параметры пула соединений
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Сколько секунд запрос ждёт свободное соединение, прежде чем получить PoolTimeout
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Сколько запросов может стоять в очереди за соединением (0 — без ограничения)
+DB_POOL_MAX_WAITING = int(os.getenv("DB_POOL_MAX_WAITING", "0"))
+# Таймаут установки TCP-соединения с Postgres
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+# Сколько секунд при старте ждём, пока Postgres станет доступен
+DB_STARTUP_TIMEOUT = float(os.getenv("DB_STARTUP_TIMEOUT", "30"))
 
-    last_exc = None
-    for attempt in range(1, retries + 1):
+# Реплики для чтения: строки подключения libpq через запятую ("host=replica1,host=replica2 port=5433").
+# Не указанные в строке параметры (база, пользователь, пароль) берутся как у основной БД.
+DB_REPLICA_DSNS = [dsn.strip() for dsn in os.getenv("DB_REPLICA_DSNS", "").split(",") if dsn.strip()]
+# Сколько секунд ждать соединение реплики, прежде чем читать с основной БД
+DB_REPLICA_POOL_TIMEOUT = float(os.getenv("DB_REPLICA_POOL_TIMEOUT", "1"))
+# Как часто проверять реплики, выведенные из ротации
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+# Сколько секунд после записи читать затронутые данные с основной БД (read-your-writes)
+DB_READ_YOUR_WRITES_WINDOW = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", "5"))
+
+logger = logging.getLogger("uvicorn.error")
+
+_pool: AsyncConnectionPool | None = None
+
+
+def _conninfo() -> str:
+    return make_conninfo(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT,
+        connect_timeout=DB_CONNECT_TIMEOUT,
+    )
+
+
+def _make_pool(conninfo: str, timeout: float, name: str) -> AsyncConnectionPool:
+    return AsyncConnectionPool(
+        conninfo,
+        min_size=DB_POOL_MIN,
+        max_size=DB_POOL_MAX,
+        timeout=timeout,
+        max_waiting=DB_POOL_MAX_WAITING,
+        # Проверяем соединение перед выдачей; при возврате пул сам откатывает
+        # незавершённую транзакцию и заменяет сломанные соединения.
+        check=AsyncConnectionPool.check_connection,
+        # Курсор с замером времени запросов для /metrics
+        kwargs={"cursor_factory": TimedCursor},
+        name=name,
+        open=False,
+    )
+
+
+class _Replica:
+    def __init__(self, index: int, dsn: str):
+        self.index = index
+        self.pool = _make_pool(
+            make_conninfo(_conninfo(), **conninfo_to_dict(dsn)), DB_REPLICA_POOL_TIMEOUT, f"replica-{index}"
+        )
+        self.healthy = True
+        self.failures = 0
+
+
+_replicas: list[_Replica] = []
+_round_robin = itertools.count()
+# Ключ данных -> до какого момента (time.monotonic) читать его с основной БД
+_recent_writes: dict[Hashable, float] = {}
+routing_stats = {"primary_reads": 0, "replica_reads": 0, "replica_failures": 0}
+
+
+async def open_pool(wait_seconds: float = DB_STARTUP_TIMEOUT) -> AsyncConnectionPool:
+    """Создаёт общий асинхронный пул соединений процесса и пулы реплик.
+
+    Вызывается один раз при старте приложения. Если Postgres ещё поднимается
+    (например, в Docker Compose), ждём его не дольше `wait_seconds`. Реплик
+    не ждём: недоступная реплика выводится из ротации, чтение идёт с основной БД.
+    """
+    global _pool
+    if _pool is not None:
+        return _pool
+    pool = _make_pool(_conninfo(), DB_POOL_TIMEOUT, "primary")
+    await pool.open(wait=True, timeout=wait_seconds)
+    _pool = pool
+    for index, dsn in enumerate(DB_REPLICA_DSNS):
+        replica = _Replica(index, dsn)
+        await replica.pool.open(wait=False)
+        _replicas.append(replica)
+    return _pool
+
+
+async def close_pool() -> None:
+    """Закрывает все соединения пулов (вызывается при остановке приложения)."""
+    global _pool
+    replicas = list(_replicas)
+    _replicas.clear()
+    for replica in replicas:
+        await replica.pool.close()
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+
+def _get_pool() -> AsyncConnectionPool:
+    if _pool is None:
+        raise RuntimeError("Пул соединений не открыт: вызовите open_pool() при старте")
+    return _pool
+
+
+@asynccontextmanager
+async def get_connection():
+    """Выдаёт соединение из общего пула и возвращает его обратно по выходу из блока.
+
+    При успешном выходе транзакция фиксируется, при исключении — откатывается.
+    """
+    pool = _get_pool()
+    started = time.perf_counter()
+    async with pool.connection() as conn:
+        metrics.pool_wait.observe(time.perf_counter() - started)
+        yield conn
+
+
+def mark_written(*keys: Hashable) -> None:
+    """Отмечает запись данных `keys`: ближайшие DB_READ_YOUR_WRITES_WINDOW секунд
+    их чтение идёт с основной БД, а не с реплики, которая могла ещё не догнать.
+    """
+    if not _replicas:
+        return
+    now = time.monotonic()
+    if len(_recent_writes) > 100_000:
+        for key in [k for k, until in _recent_writes.items() if until <= now]:
+            del _recent_writes[key]
+    for key in keys:
+        _recent_writes[key] = now + DB_READ_YOUR_WRITES_WINDOW
+
+
+def _pick_replica(keys: tuple) -> _Replica | None:
+    if not _replicas:
+        return None
+    now = time.monotonic()
+    if any(_recent_writes.get(key, 0) > now for key in keys):
+        return None
+    healthy = [r for r in _replicas if r.healthy]
+    if not healthy:
+        return None
+    return healthy[next(_round_robin) % len(healthy)]
+
+
+def _replica_failed(replica: _Replica) -> None:
+    routing_stats["replica_failures"] += 1
+    replica.failures += 1
+    if replica.healthy:
+        replica.healthy = False
+        logger.warning(f"DB replica {replica.index} is unavailable, reading from primary")
+
+
+@asynccontextmanager
+async def get_read_connection(*keys: Hashable):
+    """Соединение для чтения: реплика по кругу или основная БД.
+
+    `keys` — данные, которые читает запрос (например, ("user", id)); если
+    какие-то из них недавно записаны (mark_written), читаем с основной БД.
+    Если реплика не выдала соединение за DB_REPLICA_POOL_TIMEOUT, она
+    выводится из ротации до следующей успешной проверки, а запрос идёт на
+    основную БД. Писать через это соединение нельзя.
+    """
+    replica = _pick_replica(keys)
+    if replica is not None:
+        started = time.perf_counter()
         try:
-            return psycopg2.connect(
-                dbname=DB_NAME,
-                user=DB_USER,
-                password=DB_PASSWORD,
-                host=DB_HOST,
-                port=DB_PORT,
-            )
-        except psycopg2.OperationalError as e:
-            last_exc = e
-            if attempt == retries:
-                # Все попытки исчерпаны — пробрасываем исключение
+            conn = await replica.pool.getconn()
+        except (PoolTimeout, OperationalError):
+            _replica_failed(replica)
+        else:
+            metrics.pool_wait.observe(time.perf_counter() - started)
+            routing_stats["replica_reads"] += 1
+            try:
+                yield conn
+            except OperationalError:
+                _replica_failed(replica)
                 raise
-            # Ждем перед следующей попыткой
-            time.sleep(wait_seconds)
-    # На всякий случай пробрасываем последнее исключение
-    if last_exc:
-        raise last_exc
-
-@contextmanager
-def get_cursor():
-    """Контекстный менеджер для получения курсора базы данных."""
-    conn = get_connection()
-    try:
-        yield conn.cursor()
-    finally:
-        conn.close()
\ No newline at end of file
+            finally:
+                # Закрываем транзакцию чтения сами: соединение, возвращённое
+                # с открытой транзакцией, пул откатывает с предупреждением в лог
+                try:
+                    await conn.rollback()
+                except OperationalError:
+                    # Разорванное соединение пул при возврате закроет
+                    pass
+                await replica.pool.putconn(conn)
+            return
+    routing_stats["primary_reads"] += 1
+    async with get_connection() as conn:
+        yield conn
+
+
+@asynccontextmanager
+async def get_read_cursor(*keys: Hashable):
+    """Курсор для чтения (см. get_read_connection)."""
+    async with get_read_connection(*keys) as conn:
+        async with conn.cursor() as cur:
+            yield cur
+
+
+async def run_replica_health_loop() -> None:
+    """Фоновая задача: возвращает в ротацию реплики, которые снова отвечают."""
+    while True:
+        await asyncio.sleep(DB_REPLICA_CHECK_INTERVAL)
+        for replica in _replicas:
+            if replica.healthy:
+                continue
+            try:
+                async with replica.pool.connection(timeout=DB_REPLICA_POOL_TIMEOUT) as conn:
+                    await conn.execute("SELECT 1")
+            except Exception:
+                continue
+            replica.healthy = True
+            logger.info(f"DB replica {replica.index} is back in rotation")
+
+
+async def connect(**kwargs) -> AsyncConnection:
+    """Отдельное соединение вне пула (например, для LISTEN); закрывает его вызывающий код."""
+    return await AsyncConnection.connect(_conninfo(), **kwargs)
+
+
+def pool_stats() -> dict[str, int]:
+    """Текущее состояние пула (размер, свободные соединения, очередь ожидания)."""
+    if _pool is None:
+        return {}
+    return _pool.get_stats()
+
+
+def replica_stats() -> list[dict]:
+    return [
+        {"index": r.index, "healthy": r.healthy, "failures": r.failures, **r.pool.get_stats()}
+        for r in _replicas
+    ]
+
+
+@asynccontextmanager
+async def get_cursor():
+    """Курсор основной БД: для записи и для чтения, которому нужны самые свежие данные."""
+    async with get_connection() as conn:
+        async with conn.cursor() as cur:
+            yield cur
@@ -0,0 +1,202 @@
+"""Согласование кэшей между воркерами через LISTEN/NOTIFY Postgres.
+
+Кэши курсов, ключей ответов и номера версий ETag живут в памяти процесса.
+Код записи в той же транзакции вызывает publish(): Postgres доставляет
+NOTIFY только после COMMIT, поэтому другие воркеры узнают об изменении не
+раньше, чем его можно прочитать, и не узнают об откаченном. Те же события
+на время DB_READ_YOUR_WRITES_WINDOW направляют чтение затронутых данных на
+основную БД (db.mark_written), пока реплики их догоняют: иначе реплика
+отдала бы старые данные под уже новым ETag. Свой процесс применяет изменение
+сразу после коммита через dispatch(), а из своих же уведомлений, пришедших по
+LISTEN, берёт только номер события.
+
+Номер каждому уведомлению выдаёт последовательность cache_version_seq, общая
+для всех воркеров; он становится версией затронутых данных для ETag
+(http_cache.versions), поэтому ETag у воркеров совпадают.
+
+Каждый воркер держит одно отдельное соединение (вне пула) с LISTEN. Пока
+оно было разорвано, уведомления могли потеряться, поэтому после
+переподключения кэши сбрасываются целиком (событие RESET), а отсчёт версий
+начинается заново с текущего номера последовательности.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import defaultdict
+from typing import Callable, Iterable
+from psycopg import sql
+from cache import course_cache
+from db import connect, mark_written
+from grading import answer_key_cache
+from http_cache import versions
+
+logger = logging.getLogger("uvicorn.error")
+
+# Последовательность номеров событий (миграция 10)
+_VERSION_SEQ = "cache_version_seq"
+_NOTIFY_QUERY = f"""
+    SELECT pg_notify(%s, json_build_object(
+        'origin', %s::text, 'kind', %s::text, 'ids', %s::json, 'version', nextval('{_VERSION_SEQ}')
+    )::text)
+"""
+
+# Канал уведомлений; у всех воркеров одной базы должен совпадать
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "cache_events")
+# Пауза перед переподключением LISTEN-соединения (растёт вдвое до максимума)
+EVENTS_RECONNECT_DELAY = float(os.getenv("EVENTS_RECONNECT_DELAY", "1"))
+EVENTS_RECONNECT_MAX_DELAY = float(os.getenv("EVENTS_RECONNECT_MAX_DELAY", "30"))
+
+# Виды событий: изменился курс (ids — id курсов), каталог целиком
+# (счётчики, новые курсы), данные пользователя (ids — id пользователей)
+COURSE = "course"
+CATALOG = "catalog"
+USER = "user"
+# Только локальное: уведомления могли потеряться, сбросить всё
+RESET = "reset"
+
+# Payload NOTIFY ограничен 8000 байт: длинные списки id делим на части
+_IDS_PER_NOTIFY = 500
+# Метка процесса, чтобы не применять свои уведомления второй раз
+_ORIGIN = uuid.uuid4().hex
+
+_handlers: dict[str, list[Callable[[list[int]], None]]] = defaultdict(list)
+
+
+def subscribe(kind: str):
+    """Декоратор: регистрирует обработчик (ids) -> None для событий `kind`."""
+    def register(fn):
+        _handlers[kind].append(fn)
+        return fn
+    return register
+
+
+class EventStats:
+    def __init__(self):
+        self.published = 0
+        self.received = 0
+        self.resets = 0
+        self.listening = False
+
+
+stats = EventStats()
+
+
+def _apply_version(kind: str, ids: list[int], version: int | None) -> None:
+    """Версия данных события для ETag; None — изменены, номер ещё неизвестен."""
+    if kind == COURSE:
+        for course_id in ids:
+            versions.bump_course(course_id, version)
+    elif kind == CATALOG:
+        versions.bump_catalog(version)
+    elif kind == USER:
+        for user_id in ids:
+            versions.bump_user(user_id, version)
+
+
+async def publish(cur, kind: str, ids: Iterable[int] = ()) -> None:
+    """Отправляет уведомление в текущей транзакции `cur` (курсор или соединение).
+
+    Транзакцией управляет вызывающий код; после коммита он же вызывает dispatch().
+    Версии затронутых данных становятся неизвестны здесь, до коммита: своё
+    уведомление с номером события не может прийти раньше, и dispatch() после
+    коммита уже не затрёт пришедший номер.
+    """
+    ids = list(ids)
+    _apply_version(kind, ids, None)
+    chunks = [ids[i:i + _IDS_PER_NOTIFY] for i in range(0, len(ids), _IDS_PER_NOTIFY)] or [[]]
+    for chunk in chunks:
+        await cur.execute(_NOTIFY_QUERY, (EVENTS_CHANNEL, _ORIGIN, kind, json.dumps(chunk)))
+        stats.published += 1
+
+
+def dispatch(kind: str, ids: Iterable[int] = ()) -> None:
+    """Применяет событие к кэшам этого процесса.
+
+    Версии для ETag не трогает: их задают publish() и номер события,
+    пришедший по LISTEN (_apply_version).
+    """
+    ids = list(ids)
+    for handler in _handlers.get(kind, ()):
+        try:
+            handler(ids)
+        except Exception:
+            logger.exception(f"Failed to handle {kind} event")
+
+
+@subscribe(COURSE)
+def _invalidate_courses(ids: list[int]) -> None:
+    for course_id in ids:
+        course_cache.invalidate(course_id)
+        answer_key_cache.invalidate(course_id)
+    mark_written(*((COURSE, course_id) for course_id in ids))
+
+
+@subscribe(CATALOG)
+def _invalidate_catalog(ids: list[int]) -> None:
+    # Новый ETag каталога выдаётся сразу по приходе события, поэтому и читать
+    # каталог нужно с основной БД, пока реплики не догонят: иначе старые данные
+    # закэшируются под новым ETag до следующего события
+    mark_written(CATALOG)
+
+
+@subscribe(USER)
+def _invalidate_users(ids: list[int]) -> None:
+    mark_written(*((USER, user_id) for user_id in ids))
+
+
+@subscribe(RESET)
+def _reset_caches(ids: list[int]) -> None:
+    course_cache.clear()
+    answer_key_cache.clear()
+    versions.reset()
+
+
+def _handle_notify(payload: str) -> None:
+    try:
+        event = json.loads(payload)
+        origin, kind, ids, version = event["origin"], event["kind"], event["ids"], event["version"]
+    except (ValueError, KeyError, TypeError):
+        logger.warning(f"Ignoring malformed cache event: {payload!r}")
+        return
+    stats.received += 1
+    if origin != _ORIGIN:
+        dispatch(kind, ids)
+    _apply_version(kind, ids, version)
+
+
+async def run_listener() -> None:
+    """Фоновая задача: слушает канал и применяет события других воркеров."""
+    delay = EVENTS_RECONNECT_DELAY
+    connected_before = False
+    while True:
+        try:
+            conn = await connect(autocommit=True)
+            try:
+                await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(EVENTS_CHANNEL)))
+                # Номер читаем уже после LISTEN: события с большими номерами не пропустим
+                cur = await conn.execute(f"SELECT coalesce(pg_sequence_last_value('{_VERSION_SEQ}'), 0)")
+                floor = (await cur.fetchone())[0]
+                if connected_before:
+                    # За время разрыва могли пропустить изменения других воркеров
+                    stats.resets += 1
+                    dispatch(RESET)
+                    logger.info("Cache events listener reconnected, local caches reset")
+                versions.sync(floor)
+                connected_before = True
+                stats.listening = True
+                delay = EVENTS_RECONNECT_DELAY
+                async for notify in conn.notifies():
+                    _handle_notify(notify.payload)
+            finally:
+                stats.listening = False
+                # Без LISTEN изменения других воркеров не видны — ETag не должны совпадать
+                versions.reset()
+                await conn.close()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Cache events listener failed, reconnecting in {delay:.0f}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, EVENTS_RECONNECT_MAX_DELAY)
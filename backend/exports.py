@@ -0,0 +1,125 @@
+"""Потоковая выгрузка таблиц для аналитики (NDJSON или CSV, опционально gzip).
+
+Строки читаются серверным (именованным) курсором пачками по EXPORT_BATCH_SIZE
+и сразу уходят клиенту, поэтому память процесса не зависит от размера
+таблицы. Соединение (реплика, если есть) занято только на время передачи.
+"""
+import csv
+import io
+import os
+import zlib
+from dataclasses import dataclass
+from typing import AsyncIterator
+from db import get_read_connection
+from serialization import dumps
+
+# Сколько строк серверный курсор отдаёт за один сетевой запрос
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+@dataclass(frozen=True)
+class Export:
+    columns: tuple[str, ...]
+    query: str
+
+
+EXPORTS = {
+    "courses": Export(
+        ("id", "title", "description", "price", "students_count", "total_lessons"),
+        """
+        SELECT c.id, c.title, c.description, c.price,
+               coalesce(s.students_count, 0), coalesce(s.total_lessons, 0)
+        FROM courses c
+        LEFT JOIN course_stats s ON s.course_id = c.id
+        ORDER BY c.id
+        """,
+    ),
+    "user_courses": Export(
+        ("user_id", "course_id", "current_index", "progress_percentage", "progress_updated_at"),
+        """
+        SELECT uc.user_id, uc.course_id,
+               coalesce(p.current_index, 0), coalesce(p.progress_percentage, 0), p.updated_at
+        FROM user_courses uc
+        LEFT JOIN user_course_progress p ON p.user_id = uc.user_id AND p.course_id = uc.course_id
+        ORDER BY uc.user_id, uc.course_id
+        """,
+    ),
+    # Без хэшей паролей
+    "users": Export(
+        ("id", "username", "email", "avatar_url"),
+        "SELECT id, username, email, avatar_url FROM users ORDER BY id",
+    ),
+    # Полный дамп курсов: вопросы с ответами (включая is_correct) вложены в строку курса
+    "course_dump": Export(
+        ("id", "title", "description", "price", "questions"),
+        """
+        SELECT c.id, c.title, c.description, c.price,
+               COALESCE((
+                   SELECT json_agg(json_build_object(
+                              'id', q.id,
+                              'text', q.text,
+                              'answers', COALESCE((
+                                  SELECT json_agg(json_build_object(
+                                             'id', a.id, 'text', a.text, 'is_correct', a.is_correct
+                                         ) ORDER BY a.id)
+                                  FROM answers a
+                                  WHERE a.question_id = q.id
+                              ), '[]'::json)
+                          ) ORDER BY q.id)
+                   FROM questions q
+                   WHERE q.course_id = c.id
+               ), '[]'::json)
+        FROM courses c
+        ORDER BY c.id
+        """,
+    ),
+}
+
+
+async def _batches(export: Export, name: str) -> AsyncIterator[list[tuple]]:
+    async with get_read_connection() as conn:
+        # Именованный курсор живёт на сервере в рамках транзакции соединения
+        async with conn.cursor(name=f"export_{name}") as cur:
+            await cur.execute(export.query)
+            while True:
+                rows = await cur.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield rows
+
+
+def _ndjson(columns: tuple[str, ...], rows: list[tuple]) -> bytes:
+    return b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def _csv_text(rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # Вложенные значения (вопросы дампа курсов) — JSON в одной ячейке
+        writer.writerow([dumps(v).decode("utf-8") if isinstance(v, (list, dict)) else v for v in row])
+    return buffer.getvalue().encode("utf-8")
+
+
+async def stream_export(name: str, fmt: str, compress: bool) -> AsyncIterator[bytes]:
+    """Отдаёт выгрузку `name` кусками по пачке строк."""
+    export = EXPORTS[name]
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31 — формат gzip
+
+    def encode(chunk: bytes) -> bytes:
+        return compressor.compress(chunk) if compressor else chunk
+
+    if fmt == "csv":
+        yield encode(_csv_text([export.columns]))
+    async for rows in _batches(export, name):
+        chunk = _csv_text(rows) if fmt == "csv" else _ndjson(export.columns, rows)
+        data = encode(chunk)
+        if data:
+            yield data
+    if compressor:
+        yield compressor.flush()
@@ -0,0 +1,111 @@
+import os
+from dataclasses import dataclass
+from fastapi import HTTPException
+from cache import AsyncLRUCache
+from db import get_cursor
+
+# Параметры кэша ключей ответов (правильные ответы курса для проверки попыток)
+ANSWER_KEY_CACHE_SIZE = int(os.getenv("ANSWER_KEY_CACHE_SIZE", "10000"))
+ANSWER_KEY_CACHE_TTL = float(os.getenv("ANSWER_KEY_CACHE_TTL", "3600"))
+
+CREATE_QUIZ_ATTEMPTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS quiz_attempts (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+        course_id INTEGER NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+        score INTEGER NOT NULL,
+        total INTEGER NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+"""
+
+CREATE_QUIZ_ATTEMPT_ANSWERS_TABLE = """
+    CREATE TABLE IF NOT EXISTS quiz_attempt_answers (
+        attempt_id INTEGER NOT NULL REFERENCES quiz_attempts(id) ON DELETE CASCADE,
+        question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+        answer_id INTEGER NOT NULL REFERENCES answers(id) ON DELETE CASCADE,
+        is_correct BOOLEAN NOT NULL,
+        PRIMARY KEY (attempt_id, question_id)
+    );
+"""
+
+_ANSWER_KEY_QUERY = """
+    SELECT q.id, a.id, a.is_correct
+    FROM courses c
+    LEFT JOIN questions q ON q.course_id = c.id
+    LEFT JOIN answers a ON a.question_id = q.id
+    WHERE c.id = %s
+"""
+
+# Попытка и все её ответы записываются одним запросом
+SAVE_ATTEMPT_QUERY = """
+    WITH attempt AS (
+        INSERT INTO quiz_attempts (user_id, course_id, score, total)
+        VALUES (%s, %s, %s, %s)
+        RETURNING id
+    ), saved AS (
+        INSERT INTO quiz_attempt_answers (attempt_id, question_id, answer_id, is_correct)
+        SELECT attempt.id, t.question_id, t.answer_id, t.is_correct
+        FROM attempt, unnest(%s::int[], %s::int[], %s::bool[]) AS t(question_id, answer_id, is_correct)
+    )
+    SELECT id FROM attempt
+"""
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    """Ключ ответов курса: правильные ответы каждого вопроса и принадлежность ответов вопросам."""
+    correct: dict[int, frozenset[int]]
+    question_of: dict[int, int]
+
+    @property
+    def total(self) -> int:
+        return len(self.correct)
+
+
+async def load_answer_key(course_id: int) -> AnswerKey:
+    async with get_cursor() as cur:
+        await cur.execute(_ANSWER_KEY_QUERY, (course_id,))
+        rows = await cur.fetchall()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Курс не найден")
+    correct: dict[int, set[int]] = {}
+    question_of: dict[int, int] = {}
+    for question_id, answer_id, is_correct in rows:
+        if question_id is None:
+            continue
+        correct.setdefault(question_id, set())
+        if answer_id is None:
+            continue
+        question_of[answer_id] = question_id
+        if is_correct:
+            correct[question_id].add(answer_id)
+    return AnswerKey({q: frozenset(a) for q, a in correct.items()}, question_of)
+
+
+def grade(key: AnswerKey, pairs: list[tuple[int, int]]) -> list[dict]:
+    """Проверяет пары (question_id, answer_id) по ключу, без обращения к БД.
+
+    Вопросы, оставшиеся без ответа, засчитываются как неверные (score из total).
+    """
+    seen = set()
+    results = []
+    for question_id, answer_id in pairs:
+        if question_id not in key.correct:
+            raise HTTPException(status_code=400, detail=f"Вопрос {question_id} не относится к курсу")
+        if key.question_of.get(answer_id) != question_id:
+            raise HTTPException(status_code=400, detail=f"Ответ {answer_id} не относится к вопросу {question_id}")
+        if question_id in seen:
+            raise HTTPException(status_code=400, detail=f"На вопрос {question_id} дано несколько ответов")
+        seen.add(question_id)
+        # Правильные варианты в ответ не попадают: иначе одна попытка с любыми
+        # ответами раскрыла бы весь ключ курса
+        results.append({
+            "question_id": question_id,
+            "answer_id": answer_id,
+            "is_correct": answer_id in key.correct[question_id],
+        })
+    return results
+
+
+answer_key_cache = AsyncLRUCache(ANSWER_KEY_CACHE_SIZE, ANSWER_KEY_CACHE_TTL)
@@ -0,0 +1,109 @@
+import itertools
+import uuid
+from fastapi import Request, Response
+
+# Ответ можно хранить, но перед использованием нужно перепроверить ETag
+CACHE_CONTROL_PUBLIC = "no-cache"
+CACHE_CONTROL_PRIVATE = "private, no-cache"
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Проверяет заголовок If-None-Match (список ETag или '*') против ETag ресурса."""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class VersionTracker:
+    """Версии каталога, курсов и пользовательских списков в памяти процесса.
+
+    Версия — номер последнего события об изменении данных (events.py) из общей
+    для всех воркеров последовательности Postgres. Postgres доставляет
+    уведомления всем воркерам в порядке коммитов, поэтому одинаковые данные у
+    разных воркеров получают одинаковый ETag, а ETag считается без запроса к БД.
+
+    Данные, о которых событий не было, получают версию `floor` — номер
+    последовательности на момент подписки на события (sync). Пока версия
+    неизвестна (до sync, после своей записи до прихода её события), ETag
+    уникален для каждого ответа и не совпадает ни с каким выданным раньше.
+    """
+
+    def __init__(self):
+        self.floor: int | None = None
+        # Метка версии: "v<номер события>", "f<floor>" или None — данные
+        # изменены, а номер события ещё не пришёл
+        self.catalog: str | None = None
+        self._courses: dict[int, str | None] = {}
+        self._users: dict[int, str | None] = {}
+        self._process = uuid.uuid4().hex[:12]
+        self._unique = itertools.count()
+
+    def sync(self, floor: int) -> None:
+        """Начинает отсчёт заново с номера последовательности `floor`."""
+        self.floor = floor
+        # floor может включать номера ещё не закоммиченных событий, поэтому
+        # "f" и "v" с одним номером — разные версии
+        self.catalog = f"f{floor}"
+        self._courses.clear()
+        self._users.clear()
+
+    def reset(self) -> None:
+        """Версии неизвестны до следующего sync (события могли потеряться)."""
+        self.floor = None
+        self.catalog = None
+        self._courses.clear()
+        self._users.clear()
+
+    def bump_catalog(self, version: int | None = None) -> None:
+        self.catalog = _label(version)
+
+    def bump_course(self, course_id: int, version: int | None = None) -> None:
+        self._courses[course_id] = _label(version)
+
+    def bump_user(self, user_id: int, version: int | None = None) -> None:
+        self._users[user_id] = _label(version)
+
+    def _label(self, labels: dict[int, str | None], key: int) -> str | None:
+        return labels[key] if key in labels else f"f{self.floor}"
+
+    def _tag(self, *labels: str | None) -> str:
+        if self.floor is None or None in labels:
+            return f"x{self._process}.{next(self._unique)}"
+        return ".".join(labels)
+
+    def catalog_etag(self) -> str:
+        return f'"catalog-{self._tag(self.catalog)}"'
+
+    def course_etag(self, course_id: int) -> str:
+        return f'"course-{course_id}-{self._tag(self._label(self._courses, course_id))}"'
+
+    def user_courses_etag(self, user_id: int) -> str:
+        # Список курсов пользователя содержит счётчики курсов, поэтому зависит и от каталога
+        return f'"user-courses-{user_id}-{self._tag(self._label(self._users, user_id), self.catalog)}"'
+
+    def bootstrap_etag(self, user_id: int | None) -> str:
+        if user_id is None:
+            return f'"bootstrap-{self._tag(self.catalog)}"'
+        return f'"bootstrap-{user_id}-{self._tag(self._label(self._users, user_id), self.catalog)}"'
+
+
+def _label(version: int | None) -> str | None:
+    return None if version is None else f"v{version}"
+
+
+def not_modified(request: Request, response: Response, etag: str, cache_control: str) -> Response | None:
+    """Возвращает готовый 304, если у клиента актуальная версия.
+
+    Иначе выставляет ETag и Cache-Control в `response` и возвращает None.
+    ETag нужно вычислять до запроса к БД: тогда запись, случившаяся во время
+    запроса, в худшем случае приведёт к лишнему 200, но не к устаревшему 304.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+versions = VersionTracker()
@@ -1,133 +1,66 @@
+import asyncio
 import logging
-import base64
-import binascii
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from db import get_connection, get_cursor
-from pydantic import BaseModel
+from admission import BULK, EXPORT, READ, SEARCH, WRITE, admission, admit, overloaded
+from auth import AuthMiddleware, TokenError, current_user_id, issue_tokens, require_admin, require_user, verify_token
+from avatars import (
+    AVATAR_CACHE_CONTROL,
+    AVATAR_MAX_URL_LENGTH,
+    AvatarError,
+    decode_data_url,
+    find_avatar,
+    is_data_url,
+    save_avatar,
+)
+from cache import course_cache
+import events
+from course_import import IMPORT_CHUNK_SIZE, import_course_lines, iter_lines
+from course_stats import BULK_ENROLL_MAX_PAIRS, COURSE_STATS_RECONCILE_INTERVAL, ENROLL_QUERY, run_reconcile_loop
+from course_store import insert_courses
+from exports import EXPORTS, FORMATS, stream_export
+from grading import SAVE_ATTEMPT_QUERY, answer_key_cache, grade, load_answer_key
+from db import (
+    close_pool,
+    get_connection,
+    get_cursor,
+    get_read_connection,
+    get_read_cursor,
+    open_pool,
+    pool_stats,
+    replica_stats,
+    routing_stats,
+    run_replica_health_loop,
+)
+from migrations import run_migrations
+from http_cache import CACHE_CONTROL_PRIVATE, CACHE_CONTROL_PUBLIC, etag_matches, not_modified, versions
+from metrics import MetricsMiddleware, metrics
+from progress import progress_buffer
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, paginate, split_page
+from passwords import HashingBusy, password_hasher
+from psycopg.errors import ForeignKeyViolation, UniqueViolation
+from pydantic import BaseModel, Field
+from serialization import dumps, fast_json
+from suggest import SUGGEST_DEFAULT_LIMIT, SUGGEST_MAX_LIMIT, suggest_index
 import uvicorn
 
-app = FastAPI()
+# orjson вместо стандартного json для всех ответов по умолчанию
+app = FastAPI(default_response_class=ORJSONResponse)
 logger = logging.getLogger("uvicorn.error")
+# Фоновые задачи процесса; отменяются при остановке приложения
+background_tasks: list[asyncio.Task] = []
 
 
-def init_db() -> None:
-    """
-    Простая инициализация БД: создаём таблицу users, если её ещё нет.
-    Это защищает от ошибки 'relation \"users\" does not exist'.
+async def init_db() -> None:
+    """Приводит схему БД к актуальной версии (см. migrations.py).
+
+    Если схема уже актуальна, это один запрос без блокировок.
     """
-    conn = None
-    cur = None
-    try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL
-            );
-            """
-        )
-        # Ensure avatar_url column exists for storing user avatar (data URL or URL)
-        try:
-            cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS avatar_url TEXT")
-        except Exception:
-            pass
-        # Ensure price column exists in courses
-        try:
-            cur.execute("ALTER TABLE courses ADD COLUMN IF NOT EXISTS price INTEGER DEFAULT 0")
-        except Exception:
-            pass
-        # --- Новые таблицы для курсов ---
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS courses (
-                id SERIAL PRIMARY KEY,
-                title TEXT NOT NULL,
-                description TEXT
-            );
-            """
-        )
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS questions (
-                id SERIAL PRIMARY KEY,
-                course_id INTEGER REFERENCES courses(id) ON DELETE CASCADE,
-                text TEXT NOT NULL
-            );
-            """
-        )
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS answers (
-                id SERIAL PRIMARY KEY,
-                question_id INTEGER REFERENCES questions(id) ON DELETE CASCADE,
-                text TEXT NOT NULL,
-                is_correct BOOLEAN NOT NULL DEFAULT FALSE
-            );
-            """
-        )
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS user_courses (
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                course_id INTEGER REFERENCES courses(id) ON DELETE CASCADE,
-                PRIMARY KEY (user_id, course_id)
-            );
-            """
-        )
-        
-        # --- Добавляем демо-курс, если его еще нет ---
-        cur.execute("SELECT id FROM courses WHERE title = %s", ("Основы Python (с тестом)",))
-        if cur.fetchone() is None:
-            cur.execute(
-                "INSERT INTO courses (title, description) VALUES (%s, %s) RETURNING id",
-                ("Основы Python (с тестом)", "Изучите основы языка Python с нуля. Переменные, циклы, функции.")
-            )
-            course_id = cur.fetchone()[0]
-
-            # Список вопросов и ответов для демо-курса
-            demo_questions = [
-                ("Какая функция используется для вывода текста на экран?", [
-                    ("print()", True), ("input()", False), ("scan()", False)
-                ]),
-                ("Какой символ используется для комментариев в Python?", [
-                    ("#", True), ("//", False), ("--", False)
-                ]),
-                ("Что вернет выражение 3 * 'A'?", [
-                    ("'AAA'", True), ("'3A'", False), ("Ошибка", False)
-                ])
-            ]
-
-            for q_text, answers in demo_questions:
-                cur.execute(
-                    "INSERT INTO questions (course_id, text) VALUES (%s, %s) RETURNING id",
-                    (course_id, q_text)
-                )
-                question_id = cur.fetchone()[0]
-                
-                for a_text, is_correct in answers:
-                    cur.execute(
-                        "INSERT INTO answers (question_id, text, is_correct) VALUES (%s, %s, %s)",
-                        (question_id, a_text, is_correct)
-                    )
-            
-            logger.info("Added demo course with questions")
+    applied = await run_migrations()
+    if applied:
+        logger.info(f"DB init: applied {applied} migrations")
 
-        conn.commit()
-        logger.info("DB init: ensured users table exists")
-    except Exception as e:
-        logger.exception("Failed to init DB")
-        print(f"ОШИБКА ПРИ СОЗДАНИИ ТАБЛИЦ: {e}")
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
 app.add_middleware(
     CORSMiddleware,
@@ -141,13 +74,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
+# Проверка токена — только подпись и срок действия, без запросов к БД
+app.add_middleware(AuthMiddleware)
+# Добавлен последним, поэтому внешний: учитывает всё время обработки запроса
+app.add_middleware(MetricsMiddleware)
 
 
 @app.on_event("startup")
-def on_startup() -> None:
-    # При старте приложения убеждаемся, что таблица users существует
-    init_db()
+async def on_startup() -> None:
+    # Открываем общий пул соединений и применяем недостающие миграции схемы
+    await open_pool()
+    await init_db()
+    # Индекс подсказок по названиям курсов (GET /v1/courses/suggest)
+    await suggest_index.load()
+    if COURSE_STATS_RECONCILE_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(run_reconcile_loop()))
+    background_tasks.append(asyncio.create_task(progress_buffer.run()))
+    # Изменения, сделанные другими воркерами, приходят через LISTEN/NOTIFY
+    background_tasks.append(asyncio.create_task(events.run_listener()))
+    background_tasks.append(asyncio.create_task(run_replica_health_loop()))
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    # Дописываем в БД прогресс, накопленный с последнего сброса
+    try:
+        await progress_buffer.flush()
+    except Exception:
+        logger.exception("Failed to flush course progress on shutdown")
+    password_hasher.shutdown()
+    await close_pool()
 
 class User(BaseModel):
     id: int
@@ -155,14 +117,32 @@ class User(BaseModel):
     email: str
     avatar_url: str | None = None
 
+class PublicUser(BaseModel):
+    # Профиль другого пользователя — без email
+    id: int
+    username: str
+    avatar_url: str | None = None
+
+class AuthResponse(User):
+    # Подписанные токены (auth.py); access передаётся в Authorization: Bearer
+    access_token: str
+    refresh_token: str
+    token_type: str
+    expires_in: int
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 
 # --- Модели для курсов ---
 class AnswerBase(BaseModel):
     text: str
     is_correct: bool
 
-class Answer(AnswerBase):
+class Answer(BaseModel):
+    # В публичном курсе нет is_correct: ответы проверяются на сервере
     id: int
+    text: str
 
 class QuestionBase(BaseModel):
     text: str
@@ -205,19 +185,48 @@ class UserUpdate(BaseModel):
     avatar_url: str | None = None
 
 class EnrollRequest(BaseModel):
-    user_id: int
+    # Пользователь берётся из токена; user_id, если передан, должен с ним совпадать
+    user_id: int | None = None
     course_id: int
 
+class AttemptAnswer(BaseModel):
+    question_id: int
+    answer_id: int
+
+class AttemptSubmit(BaseModel):
+    # Без токена попытка проверяется и сохраняется анонимно
+    user_id: int | None = None
+    answers: list[AttemptAnswer] = Field(max_length=1000)
 
-@app.get("/users")
-def get_users():
-    conn = None
-    cur = None
+class BulkEnrollRequest(BaseModel):
+    # Записываются все пары пользователь × курс
+    user_ids: list[int] = Field(min_length=1, max_length=BULK_ENROLL_MAX_PAIRS)
+    course_ids: list[int] = Field(min_length=1, max_length=1000)
+
+class ProgressUpdate(BaseModel):
+    # Фронтенд (courseDetail.tsx) присылает currentIndex в camelCase
+    current_index: int = Field(alias="currentIndex", ge=0)
+    progress_percentage: int = Field(ge=0, le=100)
+
+
+@app.get("/users", dependencies=[Depends(require_admin), admit(SEARCH)])
+async def get_users(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: str | None = None,
+):
+    """Постраничный список пользователей (keyset по id, курсор в X-Next-Cursor).
+
+    Служебный эндпоинт: в ответе email, поэтому нужен заголовок X-Admin-Token.
+    """
+    after_id = decode_cursor(after) or 0
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT id, username, email FROM users")
-        users = cur.fetchall()
+        async with get_read_cursor() as cur:
+            await cur.execute(
+                "SELECT id, username, email FROM users WHERE id > %s ORDER BY id LIMIT %s",
+                (after_id, limit + 1),
+            )
+            users = paginate(await cur.fetchall(), limit, response)
         # try to include avatar_url if present
         out = []
         for u in users:
@@ -225,356 +234,762 @@ def get_users():
                 out.append({"id": u[0], "username": u[1], "email": u[2], "avatar_url": u[3]})
             else:
                 out.append({"id": u[0], "username": u[1], "email": u[2]})
-        return out
+        return fast_json(out, response)
     except Exception:
         logger.exception("Failed to fetch users")
         return JSONResponse(
             status_code=500,
             content={"detail": "Failed to fetch users"},
         )
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
-
-@app.post("/v1/enroll")
-def enroll_user(payload: EnrollRequest):
-    """Записывает пользователя на курс."""
-    conn = get_connection()
+
+@app.post("/v1/enroll", dependencies=[admit(WRITE)])
+async def enroll_user(payload: EnrollRequest, request: Request):
+    """Записывает пользователя (из токена) на курс."""
+    user_id = require_user(request, payload.user_id)
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO user_courses (user_id, course_id) VALUES (%s, %s) ON CONFLICT DO NOTHING",
-                (payload.user_id, payload.course_id)
-            )
-        conn.commit()
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                # Запись и увеличение course_stats.students_count — одним запросом
+                await cur.execute(ENROLL_QUERY, ([user_id], [payload.course_id]))
+                inserted = (await cur.fetchone())[0]
+                if inserted:
+                    # Изменились список курсов пользователя и students_count в каталоге
+                    await events.publish(cur, events.USER, [user_id])
+                    await events.publish(cur, events.CATALOG)
+            await conn.commit()
+        if inserted:
+            events.dispatch(events.USER, [user_id])
+            events.dispatch(events.CATALOG)
         return {"message": "Enrolled successfully"}
     except Exception:
         logger.exception("Failed to enroll user")
         raise HTTPException(status_code=500, detail="Ошибка при записи на курс")
-    finally:
-        conn.close()
 
-@app.get("/v1/users/{user_id}/courses")
-def get_user_courses(user_id: int):
-    """Возвращает список курсов, на которые записан пользователь."""
+@app.post("/v1/enroll/bulk", dependencies=[Depends(require_admin), admit(BULK)])
+async def enroll_users_bulk(payload: BulkEnrollRequest):
+    """Записывает группу пользователей на несколько курсов одним запросом.
+
+    Служебный эндпоинт: нужен заголовок X-Admin-Token. Уже существующие записи
+    пропускаются (ON CONFLICT DO NOTHING); в ответе — сколько пар запрошено,
+    вставлено и пропущено.
+    """
+    user_ids = list(dict.fromkeys(payload.user_ids))
+    course_ids = list(dict.fromkeys(payload.course_ids))
+    requested = len(user_ids) * len(course_ids)
+    if requested > BULK_ENROLL_MAX_PAIRS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Слишком много записей за один запрос (максимум {BULK_ENROLL_MAX_PAIRS})",
+        )
+    pair_users = [u for u in user_ids for _ in course_ids]
+    pair_courses = course_ids * len(user_ids)
+    try:
+        async with get_cursor() as cur:
+            await cur.execute(ENROLL_QUERY, (pair_users, pair_courses))
+            inserted = (await cur.fetchone())[0]
+            if inserted:
+                await events.publish(cur, events.USER, user_ids)
+                await events.publish(cur, events.CATALOG)
+    except ForeignKeyViolation:
+        raise HTTPException(status_code=404, detail="Пользователь или курс не найден")
+    except Exception:
+        logger.exception("Failed to bulk enroll users")
+        raise HTTPException(status_code=500, detail="Ошибка при записи на курсы")
+    if inserted:
+        events.dispatch(events.USER, user_ids)
+        events.dispatch(events.CATALOG)
+    return {"requested": requested, "inserted": inserted, "skipped": requested - inserted}
+
+
+# Порядок по uc.course_id идёт по первичному ключу (user_id, course_id)
+USER_COURSES_QUERY = """
+    SELECT c.id, c.title, c.description, c.price,
+           coalesce(s.students_count, 0), coalesce(s.total_lessons, 0),
+           coalesce(p.current_index, 0), coalesce(p.progress_percentage, 0)
+    FROM user_courses uc
+    JOIN courses c ON c.id = uc.course_id
+    LEFT JOIN course_stats s ON s.course_id = c.id
+    LEFT JOIN user_course_progress p ON p.user_id = uc.user_id AND p.course_id = uc.course_id
+    WHERE uc.user_id = %s AND uc.course_id > %s
+    ORDER BY uc.course_id
+    LIMIT %s
+"""
+
+# Одна запись пользователя на курс — те же столбцы, что у USER_COURSES_QUERY
+USER_COURSE_QUERY = """
+    SELECT c.id, c.title, c.description, c.price,
+           coalesce(s.students_count, 0), coalesce(s.total_lessons, 0),
+           coalesce(p.current_index, 0), coalesce(p.progress_percentage, 0)
+    FROM user_courses uc
+    JOIN courses c ON c.id = uc.course_id
+    LEFT JOIN course_stats s ON s.course_id = c.id
+    LEFT JOIN user_course_progress p ON p.user_id = uc.user_id AND p.course_id = uc.course_id
+    WHERE uc.user_id = %s AND uc.course_id = %s
+"""
+
+
+def _user_course(user_id: int, row) -> dict:
+    """Строка USER_COURSES_QUERY -> элемент списка курсов пользователя."""
+    # Прогресс, ещё не сброшенный из буфера, свежее того, что в БД
+    current_index, progress_percentage = progress_buffer.pending(user_id, row[0]) or (row[6], row[7])
+    return {
+        "id": row[0],
+        "title": row[1],
+        "description": row[2],
+        "price": row[3],
+        # Рейтинга в БД пока нет — заглушка для интерфейса фронтенда
+        "rating": 4.5,
+        "students_count": row[4],
+        "price_status": "Enrolled",
+        "total_lessons": row[5],
+        "completed_lessons": min(current_index, row[5]),
+        "progress_percentage": progress_percentage,
+    }
+
+
+@app.get("/v1/users/{user_id}/courses", dependencies=[admit(READ)])
+async def get_user_courses(
+    user_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: str | None = None,
+):
+    """Возвращает список курсов, на которые записан пользователь.
+
+    Постранично, в порядке id курса; курс следующей страницы — в X-Next-Cursor.
+    Если ETag клиента актуален, отвечает 304 без обращения к БД.
+    """
+    require_user(request, user_id)
+    after_id = decode_cursor(after) or 0
+    cached = not_modified(request, response, versions.user_courses_etag(user_id), CACHE_CONTROL_PRIVATE)
+    if cached:
+        return cached
     courses = []
     try:
-        with get_cursor() as cur:
-            cur.execute("""
-                SELECT c.id, c.title, c.description, c.price 
-                FROM courses c
-                JOIN user_courses uc ON c.id = uc.course_id
-                WHERE uc.user_id = %s
-            """, (user_id,))
-            for row in cur.fetchall():
-                courses.append({
-                    "id": row[0], 
-                    "title": row[1], 
-                    "description": row[2],
-                    "price": row[3],
-                    # Добавляем заглушки, чтобы соответствовать интерфейсу на фронтенде
-                    "rating": 4.5,
-                    "students_count": 123,
-                    "price_status": "Enrolled",
-                    "total_lessons": 3,
-                    "completed_lessons": 0,
-                    "progress_percentage": 0,
-                })
-        return courses
+        async with get_read_cursor(events.CATALOG, (events.USER, user_id)) as cur:
+            await cur.execute(USER_COURSES_QUERY, (user_id, after_id, limit + 1))
+            for row in paginate(await cur.fetchall(), limit, response):
+                courses.append(_user_course(user_id, row))
+        return fast_json(courses, response)
     except Exception:
         logger.exception("Failed to fetch user courses")
         raise HTTPException(status_code=500, detail="Ошибка получения курсов пользователя")
 
 
-@app.get("/v1/courses")
-def list_courses(q: str | None = None):
+@app.get("/v1/users/{user_id}/courses/{course_id}", dependencies=[admit(READ)])
+async def get_user_course(user_id: int, course_id: int, request: Request, response: Response):
+    """Запись пользователя на один курс: 404, если пользователь не записан.
+
+    Страница курса проверяет запись этим запросом, а не поиском по списку
+    курсов пользователя, который отдаётся постранично.
+    """
+    require_user(request, user_id)
+    cached = not_modified(request, response, versions.user_courses_etag(user_id), CACHE_CONTROL_PRIVATE)
+    if cached:
+        return cached
+    try:
+        async with get_read_cursor(events.CATALOG, (events.USER, user_id)) as cur:
+            await cur.execute(USER_COURSE_QUERY, (user_id, course_id))
+            row = await cur.fetchone()
+    except Exception:
+        logger.exception("Failed to fetch user course")
+        raise HTTPException(status_code=500, detail="Ошибка получения курсов пользователя")
+    if not row:
+        raise HTTPException(status_code=404, detail="Пользователь не записан на курс")
+    return fast_json(_user_course(user_id, row), response)
+
+
+@app.post("/v1/users/{user_id}/courses/{course_id}/progress", status_code=202)
+async def update_course_progress(user_id: int, course_id: int, payload: ProgressUpdate, request: Request):
+    """Сохраняет прогресс прохождения курса.
+
+    Запись отложенная: обновление попадает в буфер и уходит в БД пакетом
+    вместе с другими, поэтому клик по вопросу не стоит отдельной транзакции.
+    """
+    require_user(request, user_id)
+    progress_buffer.add(user_id, course_id, payload.current_index, payload.progress_percentage)
+    versions.bump_user(user_id)
+    return {"message": "Progress accepted"}
+
+
+# Поиск отдаёт только первые результаты по релевантности, без курсора
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+CATALOG_PAGE_QUERY = """
+    SELECT c.id, c.title, c.description, c.price,
+           coalesce(s.students_count, 0), coalesce(s.total_lessons, 0)
+    FROM courses c
+    LEFT JOIN course_stats s ON s.course_id = c.id
+    WHERE c.id > %s
+    ORDER BY c.id
+    LIMIT %s
+"""
+
+COURSE_SEARCH_QUERY = """
+    SELECT c.id, c.title, c.description, c.price,
+           coalesce(s.students_count, 0), coalesce(s.total_lessons, 0)
+    FROM courses c
+    CROSS JOIN websearch_to_tsquery('russian', %(q)s) AS tsq
+    LEFT JOIN course_stats s ON s.course_id = c.id
+    WHERE c.search_vector @@ tsq
+       OR %(q)s <%% c.title
+    ORDER BY ts_rank(c.search_vector, tsq) + word_similarity(%(q)s, c.title) DESC, c.id
+    LIMIT %(limit)s
+"""
+
+
+def _catalog_course(row) -> dict:
+    """Строка CATALOG_PAGE_QUERY / COURSE_SEARCH_QUERY -> элемент каталога."""
+    # Временные заглушки для полей, которых пока нет в БД
+    return {
+        "id": row[0],
+        "title": row[1],
+        "description": row[2],
+        "price": row[3],
+        "rating": 4.5,
+        "students_count": row[4],
+        "price_status": "Free",
+        "total_lessons": row[5],
+        "completed_lessons": 0,
+        "progress_percentage": 0,
+    }
+
+
+@app.get("/v1/courses/suggest")
+async def suggest_courses(
+    prefix: str = "",
+    limit: int = Query(SUGGEST_DEFAULT_LIMIT, ge=1, le=SUGGEST_MAX_LIMIT),
+):
+    """Подсказки для строки поиска: id и названия курсов, у которых название
+    или слово названия начинается с `prefix` (без учёта регистра).
+
+    Отвечает из индекса в памяти (suggest.py), к БД не обращается.
+    """
+    return fast_json(suggest_index.lookup(prefix, limit))
+
+
+def _catalog_route_class(request: Request) -> str:
+    # Страница каталога — чтение по индексу, поиск с q — дорогой запрос
+    q = request.query_params.get("q")
+    return SEARCH if q and q.strip() else READ
+
+
+@app.get("/v1/courses", dependencies=[admit(_catalog_route_class)])
+async def list_courses(
+    request: Request,
+    response: Response,
+    q: str | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: str | None = None,
+):
     """Возвращает список курсов из БД.
 
     Поддерживается опциональный параметр `q` — если передан, выполняется
-    поиск по `title` ИЛИ `description` (case-insensitive, через ILIKE).
+    полнотекстовый поиск по `title` и `description` плюс нечёткий поиск по
+    `title` (pg_trgm). Результаты упорядочены по релевантности, не более `limit`.
+
+    Без `q` каталог отдаётся постранично в порядке id: `limit` строк после
+    курсора `after`, курсор следующей страницы — в заголовке X-Next-Cursor.
+
+    Если ETag клиента совпадает с текущей версией каталога, отвечает 304 без
+    обращения к БД.
     """
+    cached = not_modified(request, response, versions.catalog_etag(), CACHE_CONTROL_PUBLIC)
+    if cached:
+        return cached
     courses = []
-    with get_cursor() as cur:
+    # Сразу после изменения каталога читаем с основной БД (см. events._invalidate_catalog)
+    async with get_read_cursor(events.CATALOG) as cur:
         if q and q.strip():
-            pattern = f"%{q.strip()}%"
-            cur.execute(
-                "SELECT id, title, description, price FROM courses WHERE title ILIKE %s OR description ILIKE %s",
-                (pattern, pattern),
-            )
+            search_limit = min(limit or SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT)
+            await cur.execute(COURSE_SEARCH_QUERY, {"q": q.strip(), "limit": search_limit})
+            rows = await cur.fetchall()
         else:
-            cur.execute("SELECT id, title, description, price FROM courses")
-
-        for row in cur.fetchall():
-            # Временные заглушки для полей, которых пока нет в БД
-            courses.append({
-                "id": row[0],
-                "title": row[1],
-                "description": row[2],
-                "price": row[3],
-                "rating": 4.5,
-                "students_count": 0,
-                "price_status": "Free",
-                "total_lessons": 0,
-                "completed_lessons": 0,
-                "progress_percentage": 0,
-            })
-    return courses
-
-
-@app.get("/v1/users/{user_id}", response_model=User)
-def get_user(user_id: int):
-    conn = None
-    cur = None
+            page_size = limit or DEFAULT_PAGE_SIZE
+            await cur.execute(CATALOG_PAGE_QUERY, (decode_cursor(after) or 0, page_size + 1))
+            rows = paginate(await cur.fetchall(), page_size, response)
+
+        for row in rows:
+            courses.append(_catalog_course(row))
+    # Строки из БД уже в нужном виде — отдаём без повторной валидации
+    return fast_json(courses, response)
+
+
+@app.get("/v1/bootstrap", dependencies=[admit(READ)])
+async def bootstrap(
+    request: Request,
+    response: Response,
+    user_id: int | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Данные для главной страницы и каталога одним запросом.
+
+    Возвращает первую страницу каталога, первую страницу курсов пользователя,
+    id всех его курсов (для отметки «Вы записаны» в каталоге) и его профиль.
+    Запросы к БД идут на одном соединении в pipeline-режиме, то есть за один
+    сетевой round trip. Дальнейшие страницы — через /v1/courses и
+    /v1/users/{id}/courses с курсорами из ответа.
+    """
+    if user_id is not None:
+        require_user(request, user_id)
+    cache_control = CACHE_CONTROL_PUBLIC if user_id is None else CACHE_CONTROL_PRIVATE
+    cached = not_modified(request, response, versions.bootstrap_etag(user_id), cache_control)
+    if cached:
+        return cached
+    # Сразу после записи каталог и данные пользователя читаются с основной БД
+    read_keys = [events.CATALOG] if user_id is None else [events.CATALOG, (events.USER, user_id)]
+    try:
+        async with get_read_connection(*read_keys) as conn:
+            async with conn.pipeline():
+                catalog_cur = await conn.execute(CATALOG_PAGE_QUERY, (0, limit + 1))
+                if user_id is not None:
+                    user_cur = await conn.execute(
+                        "SELECT id, username, email, avatar_url FROM users WHERE id = %s", (user_id,)
+                    )
+                    user_courses_cur = await conn.execute(USER_COURSES_QUERY, (user_id, 0, DEFAULT_PAGE_SIZE + 1))
+                    enrolled_cur = await conn.execute(
+                        "SELECT course_id FROM user_courses WHERE user_id = %s ORDER BY course_id", (user_id,)
+                    )
+            catalog_rows, courses_next = split_page(await catalog_cur.fetchall(), limit)
+            user_row = None
+            user_course_rows, user_courses_next = [], None
+            enrolled_ids = []
+            if user_id is not None:
+                user_row = await user_cur.fetchone()
+                user_course_rows, user_courses_next = split_page(await user_courses_cur.fetchall(), DEFAULT_PAGE_SIZE)
+                enrolled_ids = [row[0] for row in await enrolled_cur.fetchall()]
+    except Exception:
+        logger.exception("Failed to load bootstrap data")
+        raise HTTPException(status_code=500, detail="Ошибка загрузки данных")
+
+    return fast_json({
+        "courses": [_catalog_course(row) for row in catalog_rows],
+        "courses_next_cursor": courses_next,
+        "user_courses": [_user_course(user_id, row) for row in user_course_rows],
+        "user_courses_next_cursor": user_courses_next,
+        # Только id, но без ограничения страницей
+        "enrolled_course_ids": enrolled_ids,
+        "user": (
+            {"id": user_row[0], "username": user_row[1], "email": user_row[2], "avatar_url": user_row[3]}
+            if user_row else None
+        ),
+    }, response)
+
+
+@app.get("/v1/users/{user_id}", response_model=User | PublicUser, dependencies=[admit(READ)])
+async def get_user(user_id: int, request: Request):
+    """Профиль пользователя: свой — целиком, чужой — без email."""
+    token_user = require_user(request)
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT id, username, email, avatar_url FROM users WHERE id = %s", (user_id,))
-        user_row = cur.fetchone()
+        async with get_read_cursor((events.USER, user_id)) as cur:
+            await cur.execute("SELECT id, username, email, avatar_url FROM users WHERE id = %s", (user_id,))
+            user_row = await cur.fetchone()
         if not user_row:
             raise HTTPException(status_code=404, detail="Пользователь не найден")
-        return {"id": user_row[0], "username": user_row[1], "email": user_row[2], "avatar_url": user_row[3]}
+        if token_user != user_id:
+            return fast_json({"id": user_row[0], "username": user_row[1], "avatar_url": user_row[3]})
+        return fast_json({"id": user_row[0], "username": user_row[1], "email": user_row[2], "avatar_url": user_row[3]})
     except HTTPException:
         raise
     except Exception:
         logger.exception(f"Failed to fetch user {user_id}")
         raise HTTPException(status_code=500, detail="Ошибка при получении пользователя")
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
 
-@app.put("/v1/users/{user_id}", response_model=User)
-def update_user(user_id: int, user_data: UserUpdate):
-    conn = None
-    cur = None
+@app.put("/v1/users/{user_id}", response_model=User, dependencies=[admit(WRITE)])
+async def update_user(user_id: int, user_data: UserUpdate, request: Request):
+    require_user(request, user_id)
+    avatar_url = user_data.avatar_url
+    if avatar_url is not None:
+        # data URL (base64) декодируем один раз и кладём файлом в хранилище,
+        # а в строке пользователя оставляем только короткий URL. Pillow работает
+        # до того, как занять соединение из пула.
+        try:
+            if is_data_url(avatar_url):
+                avatar_url = await asyncio.to_thread(save_avatar, decode_data_url(avatar_url))
+            elif len(avatar_url) > AVATAR_MAX_URL_LENGTH:
+                raise AvatarError("Слишком длинная ссылка на аватар")
+        except AvatarError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT id FROM users WHERE id = %s", (user_id,))
-        if not cur.fetchone():
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-
-        updates = []
-        values = []
-
-        if user_data.username is not None:
-            cur.execute("SELECT id FROM users WHERE username = %s AND id != %s", (user_data.username, user_id))
-            if cur.fetchone():
-                raise HTTPException(status_code=400, detail="Пользователь с таким именем уже существует")
-            updates.append("username = %s")
-            values.append(user_data.username)
-
-        if user_data.email is not None:
-            cur.execute("SELECT id FROM users WHERE email = %s AND id != %s", (user_data.email, user_id))
-            if cur.fetchone():
-                raise HTTPException(status_code=400, detail="Пользователь с таким email уже существует")
-            updates.append("email = %s")
-            values.append(user_data.email)
-
-        if user_data.avatar_url is not None:
-            # Если передан data URL (base64), проверим размер декодированных данных
-            MAX_BYTES = 5 * 1024 * 1024  # 5 MB
-            au = user_data.avatar_url
-            if isinstance(au, str) and au.startswith("data:") and ";base64," in au:
-                try:
-                    b64 = au.split(',', 1)[1]
-                    decoded = base64.b64decode(b64)
-                except (IndexError, binascii.Error):
-                    raise HTTPException(status_code=400, detail="Неверный формат изображения")
-                if len(decoded) > MAX_BYTES:
-                    raise HTTPException(status_code=400, detail="Размер аватара не должен превышать 5MB")
-
-            updates.append("avatar_url = %s")
-            values.append(user_data.avatar_url)
-
-        if not updates:
-            cur.execute("SELECT id, username, email, avatar_url FROM users WHERE id = %s", (user_id,))
-            user_row = cur.fetchone()
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute("SELECT id FROM users WHERE id = %s", (user_id,))
+            if not await cur.fetchone():
+                raise HTTPException(status_code=404, detail="Пользователь не найден")
+
+            updates = []
+            values = []
+
+            if user_data.username is not None:
+                await cur.execute("SELECT id FROM users WHERE username = %s AND id != %s", (user_data.username, user_id))
+                if await cur.fetchone():
+                    raise HTTPException(status_code=400, detail="Пользователь с таким именем уже существует")
+                updates.append("username = %s")
+                values.append(user_data.username)
+
+            if user_data.email is not None:
+                await cur.execute("SELECT id FROM users WHERE email = %s AND id != %s", (user_data.email, user_id))
+                if await cur.fetchone():
+                    raise HTTPException(status_code=400, detail="Пользователь с таким email уже существует")
+                updates.append("email = %s")
+                values.append(user_data.email)
+
+            if avatar_url is not None:
+                updates.append("avatar_url = %s")
+                values.append(avatar_url)
+
+            if not updates:
+                await cur.execute("SELECT id, username, email, avatar_url FROM users WHERE id = %s", (user_id,))
+                user_row = await cur.fetchone()
+                return {"id": user_row[0], "username": user_row[1], "email": user_row[2], "avatar_url": user_row[3]}
+
+            values.append(user_id)
+            query = f"UPDATE users SET {', '.join(updates)} WHERE id = %s RETURNING id, username, email, avatar_url"
+            await cur.execute(query, values)
+            user_row = await cur.fetchone()
+            # Профиль входит в ответ /v1/bootstrap
+            await events.publish(cur, events.USER, [user_id])
+            await conn.commit()
+            events.dispatch(events.USER, [user_id])
             return {"id": user_row[0], "username": user_row[1], "email": user_row[2], "avatar_url": user_row[3]}
 
-        values.append(user_id)
-        query = f"UPDATE users SET {', '.join(updates)} WHERE id = %s RETURNING id, username, email, avatar_url"
-        cur.execute(query, values)
-        user_row = cur.fetchone()
-        conn.commit()
-        return {"id": user_row[0], "username": user_row[1], "email": user_row[2], "avatar_url": user_row[3]}
-
     except HTTPException:
         raise
     except Exception:
-        conn.rollback()
         logger.exception(f"Failed to update user {user_id}")
         raise HTTPException(status_code=500, detail="Ошибка при обновлении пользователя")
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
 
-@app.post("/v1/courses", response_model=Course)
-def create_course(course_data: CourseCreate):
+@app.get("/v1/avatars/{name}")
+async def get_avatar(name: str, request: Request):
+    """Отдаёт файл аватара или миниатюры (имя — sha256 содержимого).
+
+    Файлы неизменяемы, поэтому кэшируются надолго; поддерживаются
+    If-None-Match (304) и Range-запросы.
+    """
+    found = find_avatar(name)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Аватар не найден")
+    path, media_type, etag = found
+    headers = {"ETag": etag, "Cache-Control": AVATAR_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+@app.post("/v1/courses", response_model=Course, dependencies=[admit(WRITE)])
+async def create_course(course_data: CourseCreate):
     """Создает новый курс, его вопросы и ответы в БД."""
-    conn = get_connection()
     try:
-        with conn.cursor() as cur:
-            # 1. Создаем курс
-            cur.execute(
-                "INSERT INTO courses (title, description, price) VALUES (%s, %s, %s) RETURNING id",
-                (course_data.title, course_data.description, course_data.price)
-            )
-            course_id = cur.fetchone()[0]
-
-            # 2. Создаем вопросы и ответы
-            for question_data in course_data.questions:
-                cur.execute(
-                    "INSERT INTO questions (course_id, text) VALUES (%s, %s) RETURNING id",
-                    (course_id, question_data.text)
-                )
-                question_id = cur.fetchone()[0]
-
-                for answer_data in question_data.answers:
-                    cur.execute(
-                        "INSERT INTO answers (question_id, text, is_correct) VALUES (%s, %s, %s)",
-                        (question_id, answer_data.text, answer_data.is_correct)
-                    )
-        
-        conn.commit()
-        return Course(id=course_id, title=course_data.title, description=course_data.description, price=course_data.price)
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                # Курс, все вопросы и все ответы — тремя пакетными INSERT
+                course_id = (await insert_courses(cur, [course_data]))[0]
+                await events.publish(cur, events.COURSE, [course_id])
+                await events.publish(cur, events.CATALOG)
+            await conn.commit()
+            # Название уже известно — в индекс подсказок без повторного запроса
+            suggest_index.add([(course_id, course_data.title)])
+            events.dispatch(events.COURSE, [course_id])
+            events.dispatch(events.CATALOG)
+            return Course(id=course_id, title=course_data.title, description=course_data.description, price=course_data.price)
 
     except Exception:
-        conn.rollback()
         logger.exception("Failed to create course")
         raise HTTPException(status_code=500, detail="Ошибка при создании курса")
-    finally:
-        conn.close()
 
 
-@app.get("/v1/course/{course_id}", response_model=CourseWithQuestions)
-def get_course(course_id: int):
+COURSE_TREE_QUERY = """
+    SELECT c.id, c.title, c.description, c.price,
+           COALESCE((
+               SELECT json_agg(json_build_object(
+                          'id', q.id,
+                          'text', q.text,
+                          'answers', COALESCE((
+                              SELECT json_agg(json_build_object(
+                                         'id', a.id, 'text', a.text
+                                     ) ORDER BY a.id)
+                              FROM answers a
+                              WHERE a.question_id = q.id
+                          ), '[]'::json)
+                      ) ORDER BY q.id)
+               FROM questions q
+               WHERE q.course_id = c.id
+           ), '[]'::json) AS questions
+    FROM courses c
+    WHERE c.id = %s
+"""
+
+
+async def _load_course(course_id: int) -> bytes:
+    """Загружает курс из БД и возвращает его уже сериализованным в JSON."""
+    async with get_read_cursor((events.COURSE, course_id)) as cur:
+        # Курс, вопросы и ответы собираем одним запросом через JSON-агрегацию,
+        # чтобы не делать отдельный SELECT по answers на каждый вопрос (N+1).
+        await cur.execute(COURSE_TREE_QUERY, (course_id,))
+        course_row = await cur.fetchone()
+    if not course_row:
+        raise HTTPException(status_code=404, detail="Курс не найден")
+
+    # psycopg сам разбирает json-колонку в list[dict]
+    course_result = {"id": course_row[0], "title": course_row[1], "description": course_row[2], "price": course_row[3], "questions": course_row[4]}
+    return dumps(course_result)
+
+
+@app.post("/v1/courses/import", dependencies=[Depends(require_admin), admit(BULK)])
+async def import_courses(request: Request, chunk_size: int = Query(IMPORT_CHUNK_SIZE, ge=1, le=10000)):
+    """Массовый импорт курсов из тела запроса в формате JSONL (строка — CourseCreate).
+
+    Служебный эндпоинт: нужен заголовок X-Admin-Token. Курсы пишутся пачками
+    в отдельных транзакциях; в ответе — число записанных курсов и строк,
+    скорость (строк/с) и ошибки по строкам и пачкам.
+    """
+    report = await import_course_lines(iter_lines(request.stream()), CourseCreate, chunk_size)
+    # Другим воркерам уведомления отправлены в транзакциях пачек
+    events.dispatch(events.COURSE, report.pop("course_ids"))
+    if report["courses"]:
+        events.dispatch(events.CATALOG)
+    return report
+
+
+@app.get("/v1/course/{course_id}", response_model=CourseWithQuestions, dependencies=[admit(READ)])
+async def get_course(course_id: int, request: Request):
     """Возвращает полную информацию о курсе с вопросами и ответами."""
+    etag = versions.course_etag(course_id)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL_PUBLIC}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
     try:
-        with get_cursor() as cur:
-            # Получаем основную информацию о курсе
-            cur.execute("SELECT id, title, description, price FROM courses WHERE id = %s", (course_id,))
-            course_row = cur.fetchone()
-            if not course_row:
-                raise HTTPException(status_code=404, detail="Курс не найден")
-
-            course_result = {"id": course_row[0], "title": course_row[1], "description": course_row[2], "price": course_row[3], "questions": []}
-
-            # Получаем все вопросы для этого курса
-            cur.execute("SELECT id, text FROM questions WHERE course_id = %s ORDER BY id", (course_id,))
-            questions = cur.fetchall()
-
-            for q_id, q_text in questions:
-                question_data = {"id": q_id, "text": q_text, "answers": []}
-                
-                # Получаем все ответы для текущего вопроса
-                cur.execute("SELECT id, text, is_correct FROM answers WHERE question_id = %s ORDER BY id", (q_id,))
-                answers = cur.fetchall()
-                
-                for a_id, a_text, a_is_correct in answers:
-                    question_data["answers"].append({"id": a_id, "text": a_text, "is_correct": a_is_correct})
-                
-                course_result["questions"].append(question_data)
-
-            return course_result
-
+        # Готовый JSON берём из кэша; одновременные промахи ждут одну загрузку
+        body = await course_cache.get_or_load(course_id, lambda: _load_course(course_id))
+        return Response(content=body, media_type="application/json", headers=headers)
     except HTTPException:
         raise
     except Exception:
         logger.exception(f"Failed to fetch course {course_id}")
         raise HTTPException(status_code=500, detail="Ошибка при получении курса")
-        
 
-@app.post("/auth/register", response_model=User)
-def register_user(payload: UserCreate):
-    conn = None
-    cur = None
+
+@app.post("/v1/courses/{course_id}/attempts", status_code=201, dependencies=[admit(WRITE)])
+async def submit_attempt(course_id: int, payload: AttemptSubmit, request: Request):
+    """Проверяет попытку прохождения теста и сохраняет её результат.
+
+    Ответы сверяются с ключом курса из памяти (answer_key_cache), таблица
+    answers при проверке не читается. Попытка и все её ответы записываются
+    одним запросом. В ответе — счёт и отметка верно/неверно по каждому ответу.
+    """
+    user_id = require_user(request, payload.user_id) if payload.user_id is not None else current_user_id(request)
+    key = await answer_key_cache.get_or_load(course_id, lambda: load_answer_key(course_id))
+    results = grade(key, [(a.question_id, a.answer_id) for a in payload.answers])
+    score = sum(r["is_correct"] for r in results)
     try:
-        conn = get_connection()
-        cur = conn.cursor()
+        async with get_cursor() as cur:
+            await cur.execute(
+                SAVE_ATTEMPT_QUERY,
+                (
+                    user_id, course_id, score, key.total,
+                    [r["question_id"] for r in results],
+                    [r["answer_id"] for r in results],
+                    [r["is_correct"] for r in results],
+                ),
+            )
+            attempt_id = (await cur.fetchone())[0]
+    except ForeignKeyViolation:
+        raise HTTPException(status_code=404, detail="Пользователь или курс не найден")
+    except Exception:
+        logger.exception(f"Failed to save attempt for course {course_id}")
+        raise HTTPException(status_code=500, detail="Ошибка при сохранении попытки")
+    return fast_json({"attempt_id": attempt_id, "score": score, "total": key.total, "results": results}, status_code=201)
+
+
+@app.get("/v1/admin/export/{name}", dependencies=[Depends(require_admin), admit(EXPORT)])
+async def export_table(
+    name: str,
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+):
+    """Потоковая выгрузка courses, user_courses, users или course_dump (курсы с
+    вопросами и ответами) в NDJSON или CSV, опционально сжатая gzip.
+
+    Доступна по заголовку X-Admin-Token. Строки читаются серверным курсором
+    пачками, так что память не растёт с размером таблицы.
+    """
+    if name not in EXPORTS:
+        raise HTTPException(status_code=404, detail="Неизвестная выгрузка")
+    filename = f"{name}.{fmt}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_export(name, fmt, gzip),
+        media_type="application/gzip" if gzip else FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/v1/cache/stats")
+async def get_cache_stats():
+    """Счётчики попаданий/промахов/вытеснений кэша курсов (для подбора размера)."""
+    return {
+        "course": course_cache.stats(),
+        "answer_key": answer_key_cache.stats(),
+        "suggest": suggest_index.stats(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Метрики процесса в формате Prometheus (HTTP, БД, пул соединений, кэш)."""
+    pool = pool_stats()
+    cache = course_cache.stats()
+    answer_keys = answer_key_cache.stats()
+    hashing = password_hasher.stats()
+    admitted = admission.stats()
+    gauges = {
+        "db_pool_size": pool.get("pool_size", 0),
+        "db_pool_max": pool.get("pool_max", 0),
+        "db_pool_available": pool.get("pool_available", 0),
+        "db_pool_requests_waiting": pool.get("requests_waiting", 0),
+        "course_cache_size": cache["size"],
+        "course_cache_hit_rate": cache["hit_rate"],
+        "answer_key_cache_size": answer_keys["size"],
+        "answer_key_cache_hit_rate": answer_keys["hit_rate"],
+        "password_hash_in_flight": hashing["in_flight"],
+        "progress_buffer_pending": progress_buffer.pending_count(),
+        "cache_events_listening": int(events.stats.listening),
+        "admission_active": admitted["active"],
+    }
+    counters = {
+        "db_pool_requests_total": pool.get("requests_num", 0),
+        "db_pool_requests_queued_total": pool.get("requests_queued", 0),
+        "db_pool_requests_timeouts_total": pool.get("requests_errors", 0),
+        "db_pool_requests_wait_ms_total": pool.get("requests_wait_ms", 0),
+        "course_cache_hits_total": cache["hits"],
+        "course_cache_misses_total": cache["misses"],
+        "course_cache_evictions_total": cache["evictions"],
+        "answer_key_cache_hits_total": answer_keys["hits"],
+        "password_hash_rejected_total": hashing["rejected"],
+        "password_verify_cache_hits_total": hashing["verify_cache"]["hits"],
+        "password_verify_cache_misses_total": hashing["verify_cache"]["misses"],
+        "answer_key_cache_misses_total": answer_keys["misses"],
+        "cache_events_published_total": events.stats.published,
+        "cache_events_received_total": events.stats.received,
+        "cache_events_resets_total": events.stats.resets,
+        "db_primary_reads_total": routing_stats["primary_reads"],
+        "db_replica_reads_total": routing_stats["replica_reads"],
+        "db_replica_failures_total": routing_stats["replica_failures"],
+    }
+    for replica in replica_stats():
+        gauges[f"db_replica_{replica['index']}_healthy"] = int(replica["healthy"])
+        gauges[f"db_replica_{replica['index']}_pool_available"] = replica.get("pool_available", 0)
+    # Очередь и отказы контроля допуска по классам маршрутов
+    for name, route_class in admitted["classes"].items():
+        gauges[f"admission_{name}_active"] = route_class["active"]
+        gauges[f"admission_{name}_queued"] = route_class["queued"]
+        counters[f"admission_{name}_admitted_total"] = route_class["admitted"]
+        counters[f"admission_{name}_shed_total"] = route_class["shed"]
+        counters[f"admission_{name}_timeouts_total"] = route_class["timeouts"]
+    return Response(metrics.render(gauges, counters), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/auth/register", response_model=AuthResponse, dependencies=[admit(WRITE)])
+async def register_user(payload: UserCreate):
+    # Хэшируем до того, как занять соединение из пула
+    try:
+        password_hash = await password_hasher.hash(payload.password)
+    except HashingBusy:
+        raise overloaded()
+    try:
+        async with get_connection() as conn, conn.cursor() as cur:
+            # Проверяем, нет ли пользователя с таким email или username
+            await cur.execute(
+                "SELECT id FROM users WHERE email = %s OR username = %s",
+                (payload.email, payload.username),
+            )
+            existing = await cur.fetchone()
+            if existing:
+                raise HTTPException(status_code=400, detail="Пользователь уже существует")
 
-        # Проверяем, нет ли пользователя с таким email или username
-        cur.execute(
-            "SELECT id FROM users WHERE email = %s OR username = %s",
-            (payload.email, payload.username),
-        )
-        existing = cur.fetchone()
-        if existing:
-            raise HTTPException(status_code=400, detail="Пользователь уже существует")
-
-        # В демо-режиме пароль храним как есть (в реале нужно хэширование!)
-        cur.execute(
-            "INSERT INTO users (username, email, password, avatar_url) VALUES (%s, %s, %s, %s) RETURNING id",
-            (payload.username, payload.email, payload.password, None),
-        )
-        user_id = cur.fetchone()[0]
-        conn.commit()
+            await cur.execute(
+                "INSERT INTO users (username, email, password, avatar_url) VALUES (%s, %s, %s, %s) RETURNING id",
+                (payload.username, payload.email, password_hash, None),
+            )
+            user_id = (await cur.fetchone())[0]
+            await conn.commit()
 
-        return {"id": user_id, "username": payload.username, "email": payload.email}
+            return {"id": user_id, "username": payload.username, "email": payload.email, **issue_tokens(user_id)}
 
     except HTTPException:
         raise
+    except UniqueViolation:
+        # Такой же пользователь зарегистрировался параллельно
+        raise HTTPException(status_code=400, detail="Пользователь уже существует")
     except Exception as e:
         logger.exception("Failed to register user")
         print(f"ОШИБКА ПРИ РЕГИСТРАЦИИ: {e}")
         raise HTTPException(status_code=500, detail="Ошибка при регистрации")
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
 
-@app.post("/auth/login", response_model=User)
-def login(payload: LoginRequest):
-    conn = None
-    cur = None
+@app.post("/auth/login", response_model=AuthResponse, dependencies=[admit(WRITE)])
+async def login(payload: LoginRequest):
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-
-        # Логин может быть email или username
-        cur.execute(
-            "SELECT id, username, email, password FROM users WHERE email = %s OR username = %s",
-            (payload.login, payload.login),
-        )
-        row = cur.fetchone()
-
-        if not row:
-            raise HTTPException(status_code=400, detail="Неверный логин или пароль")
-
-        user_id, username, email, stored_password = row
+        async with get_cursor() as cur:
+            # Логин может быть email или username; профиль целиком — одним запросом
+            await cur.execute(
+                "SELECT id, username, email, password, avatar_url FROM users WHERE email = %s OR username = %s",
+                (payload.login, payload.login),
+            )
+            row = await cur.fetchone()
+    except Exception:
+        logger.exception("Failed to login user")
+        raise HTTPException(status_code=500, detail="Ошибка при входе")
 
-        if stored_password != payload.password:
-            raise HTTPException(status_code=400, detail="Неверный логин или пароль")
+    if not row:
+        raise HTTPException(status_code=400, detail="Неверный логин или пароль")
+    user_id, username, email, stored_password, avatar = row
 
-        # try to return avatar_url if present
+    # Проверка пароля идёт в пуле хэширования, соединение с БД в это время свободно
+    try:
+        ok, new_hash = await password_hasher.verify(payload.password, stored_password)
+    except HashingBusy:
+        raise overloaded()
+    if not ok:
+        raise HTTPException(status_code=400, detail="Неверный логин или пароль")
+
+    if new_hash:
+        # Пароль хранился открытым текстом или со старыми параметрами — перезаписываем хэш
         try:
-            cur.execute("SELECT avatar_url FROM users WHERE id = %s", (user_id,))
-            av = cur.fetchone()
-            avatar = av[0] if av and len(av) > 0 else None
+            async with get_cursor() as cur:
+                await cur.execute(
+                    "UPDATE users SET password = %s WHERE id = %s AND password = %s",
+                    (new_hash, user_id, stored_password),
+                )
         except Exception:
-            avatar = None
+            logger.exception(f"Failed to upgrade password hash for user {user_id}")
 
-        return {"id": user_id, "username": username, "email": email, "avatar_url": avatar}
+    return {"id": user_id, "username": username, "email": email, "avatar_url": avatar, **issue_tokens(user_id)}
 
-    except HTTPException:
-        raise
+
+@app.post("/auth/refresh", dependencies=[admit(READ)])
+async def refresh_tokens(payload: RefreshRequest):
+    """Выдаёт новую пару токенов по действующему refresh-токену.
+
+    Единственное место, где токен сверяется с БД: удалённый пользователь
+    не сможет продлить сессию. Обычные запросы проверяют только подпись.
+    """
+    try:
+        user_id = verify_token(payload.refresh_token, "refresh")
+    except TokenError:
+        raise HTTPException(status_code=401, detail="Недействительный refresh-токен")
+    try:
+        async with get_cursor() as cur:
+            await cur.execute("SELECT 1 FROM users WHERE id = %s", (user_id,))
+            exists = await cur.fetchone()
     except Exception:
-        logger.exception("Failed to login user")
-        raise HTTPException(status_code=500, detail="Ошибка при входе")
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+        logger.exception("Failed to refresh tokens")
+        raise HTTPException(status_code=500, detail="Ошибка при обновлении токена")
+    if not exists:
+        raise HTTPException(status_code=401, detail="Недействительный refresh-токен")
+    return issue_tokens(user_id)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,195 @@
+"""Метрики процесса в формате Prometheus.
+
+HTTP: число запросов, ошибок и гистограмма задержек по шаблону маршрута,
+а также гистограмма числа запросов к БД на один HTTP-запрос (ловит N+1).
+БД: число и время запросов; курсор TimedCursor подключается к соединениям
+пула через cursor_factory, так что учитываются и cur.execute, и conn.execute.
+Запросы медленнее SLOW_QUERY_THRESHOLD_MS пишутся в лог.
+
+Метрики хранятся в памяти процесса: при нескольких воркерах uvicorn каждый
+отдаёт свои, суммирует их Prometheus.
+"""
+import contextvars
+import logging
+import os
+import time
+from psycopg import AsyncCursor
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger("uvicorn.error")
+
+# Порог для лога медленных запросов к БД в миллисекундах (0 — не логировать)
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+
+# Границы корзин гистограмм (секунды и штуки)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Счётчик запросов к БД текущего HTTP-запроса
+_request_queries: contextvars.ContextVar[list[int] | None] = contextvars.ContextVar("request_queries", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+    def render(self, name: str, labels: str) -> list[str]:
+        sep = "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.total}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.total}")
+        return lines
+
+
+class Metrics:
+    """Реестр метрик процесса."""
+
+    def __init__(self):
+        # (method, route) -> {status_class: count}
+        self.requests: dict[tuple[str, str], dict[str, int]] = {}
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self.request_queries: dict[tuple[str, str], Histogram] = {}
+        self.queries = 0
+        self.query_errors = 0
+        self.slow_queries = 0
+        self.query_latency = Histogram(LATENCY_BUCKETS)
+        self.pool_wait = Histogram(LATENCY_BUCKETS)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, queries: int) -> None:
+        key = (method, route)
+        by_status = self.requests.setdefault(key, {})
+        status_class = f"{status // 100}xx"
+        by_status[status_class] = by_status.get(status_class, 0) + 1
+        self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+        self.request_queries.setdefault(key, Histogram(QUERY_COUNT_BUCKETS)).observe(queries)
+
+    def observe_query(self, query, seconds: float, failed: bool) -> None:
+        self.queries += 1
+        self.query_errors += failed
+        self.query_latency.observe(seconds)
+        counter = _request_queries.get()
+        if counter is not None:
+            counter[0] += 1
+        if SLOW_QUERY_THRESHOLD_MS and seconds * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+            self.slow_queries += 1
+            text = query if isinstance(query, str) else repr(query)
+            logger.warning(f"Slow query ({seconds * 1000:.0f} ms): {' '.join(text.split())[:500]}")
+
+    def render(self, gauges: dict[str, float], counters: dict[str, float]) -> str:
+        """Текст в формате Prometheus.
+
+        `gauges` и `counters` — внешние значения (пул, кэш и т.п.), которые
+        снимаются в момент запроса /metrics.
+        """
+        lines = ["# TYPE http_requests_total counter"]
+        for (method, route), by_status in sorted(self.requests.items()):
+            for status_class, count in sorted(by_status.items()):
+                lines.append(
+                    f'http_requests_total{{method="{method}",route="{route}",status="{status_class}"}} {count}'
+                )
+        lines.append("# TYPE http_request_duration_seconds histogram")
+        for (method, route), hist in sorted(self.latency.items()):
+            lines += hist.render("http_request_duration_seconds", f'method="{method}",route="{route}"')
+        lines.append("# TYPE http_request_db_queries histogram")
+        for (method, route), hist in sorted(self.request_queries.items()):
+            lines += hist.render("http_request_db_queries", f'method="{method}",route="{route}"')
+        lines += [
+            "# TYPE db_queries_total counter",
+            f"db_queries_total {self.queries}",
+            "# TYPE db_query_errors_total counter",
+            f"db_query_errors_total {self.query_errors}",
+            "# TYPE db_slow_queries_total counter",
+            f"db_slow_queries_total {self.slow_queries}",
+            "# TYPE db_query_duration_seconds histogram",
+            *self.query_latency.render("db_query_duration_seconds", ""),
+            "# TYPE db_pool_wait_seconds histogram",
+            *self.pool_wait.render("db_pool_wait_seconds", ""),
+        ]
+        for kind, values in (("gauge", gauges), ("counter", counters)):
+            for name, value in values.items():
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class TimedCursor(AsyncCursor):
+    """Курсор, который засекает время каждого запроса и считает его в метриках."""
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await super().execute(query, params, **kwargs)
+            failed = False
+            return result
+        finally:
+            metrics.observe_query(query, time.perf_counter() - started, failed)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await super().executemany(query, params_seq, **kwargs)
+            failed = False
+            return result
+        finally:
+            metrics.observe_query(query, time.perf_counter() - started, failed)
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время, статус и число запросов к БД для каждого HTTP-запроса.
+
+    Маршрут берётся шаблоном (/v1/course/{course_id}), чтобы число рядов
+    метрик не росло с числом id.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        counter = [0]
+        token = _request_queries.set(counter)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_queries.reset(token)
+            route = scope.get("route")
+            metrics.observe_request(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status,
+                time.perf_counter() - started,
+                counter[0],
+            )
@@ -0,0 +1,243 @@
+"""Версионированные миграции схемы БД.
+
+Каждая миграция имеет номер версии и выполняется ровно один раз в своей
+транзакции; применённые версии записываются в таблицу schema_version.
+Если схема актуальна, запуск стоит один запрос (max(version) по первичному
+ключу) и не берёт блокировок. Иначе воркер берёт advisory lock, и миграции
+применяет только он, а остальные ждут и после перепроверки ничего не делают.
+
+Миграции первых версий написаны через IF NOT EXISTS: базы, созданные прежним
+init_db, проходят их без ошибок и просто получают записи в schema_version.
+"""
+import logging
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Awaitable, Callable
+from avatars import migrate_inline_avatars
+from course_stats import CREATE_COURSE_STATS_TABLE
+from course_store import insert_courses
+from db import get_connection
+from grading import CREATE_QUIZ_ATTEMPT_ANSWERS_TABLE, CREATE_QUIZ_ATTEMPTS_TABLE
+from progress import CREATE_PROGRESS_TABLE
+
+logger = logging.getLogger("uvicorn.error")
+
+# Ключ advisory lock: миграции одновременно применяет только один воркер
+_MIGRATION_LOCK_KEY = 0x4D49_4752  # 'MIGR'
+
+CREATE_SCHEMA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: Callable[..., Awaitable[None]]
+
+
+MIGRATIONS: dict[int, Migration] = {}
+
+
+def migration(version: int, description: str):
+    """Декоратор: регистрирует async-функцию (cur) -> None как миграцию `version`."""
+    def register(fn):
+        if version in MIGRATIONS:
+            raise ValueError(f"Duplicate migration version {version}")
+        MIGRATIONS[version] = Migration(version, description, fn)
+        return fn
+    return register
+
+
+def sql_migration(version: int, description: str, *statements: str) -> None:
+    """Регистрирует миграцию из последовательности SQL-команд."""
+    async def apply(cur) -> None:
+        for statement in statements:
+            await cur.execute(statement)
+    migration(version, description)(apply)
+
+
+def latest_version() -> int:
+    return max(MIGRATIONS, default=0)
+
+
+async def _current_version(conn) -> int:
+    cur = await conn.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+    if not (await cur.fetchone())[0]:
+        return 0
+    cur = await conn.execute("SELECT coalesce(max(version), 0) FROM schema_version")
+    return (await cur.fetchone())[0]
+
+
+async def run_migrations() -> int:
+    """Применяет недостающие миграции и возвращает их число."""
+    latest = latest_version()
+    async with get_connection() as conn:
+        await conn.set_autocommit(True)
+        try:
+            if await _current_version(conn) >= latest:
+                return 0
+            await conn.execute("SELECT pg_advisory_lock(%s)", (_MIGRATION_LOCK_KEY,))
+            try:
+                await conn.execute(CREATE_SCHEMA_VERSION_TABLE)
+                # Пока ждали блокировку, миграции мог применить другой воркер
+                current = await _current_version(conn)
+                pending = [MIGRATIONS[v] for v in sorted(MIGRATIONS) if v > current]
+                for m in pending:
+                    logger.info(f"Applying migration {m.version}: {m.description}")
+                    async with conn.transaction(), conn.cursor() as cur:
+                        await m.apply(cur)
+                        await cur.execute(
+                            "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                            (m.version, m.description),
+                        )
+                return len(pending)
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock(%s)", (_MIGRATION_LOCK_KEY,))
+        finally:
+            await conn.set_autocommit(False)
+
+
+sql_migration(
+    1,
+    "users, courses, questions, answers, user_courses",
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        avatar_url TEXT
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS courses (
+        id SERIAL PRIMARY KEY,
+        title TEXT NOT NULL,
+        description TEXT,
+        price INTEGER DEFAULT 0
+    );
+    """,
+    # Колонки, которых не было в таблицах, созданных ранними версиями приложения
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS avatar_url TEXT",
+    "ALTER TABLE courses ADD COLUMN IF NOT EXISTS price INTEGER DEFAULT 0",
+    """
+    CREATE TABLE IF NOT EXISTS questions (
+        id SERIAL PRIMARY KEY,
+        course_id INTEGER REFERENCES courses(id) ON DELETE CASCADE,
+        text TEXT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS answers (
+        id SERIAL PRIMARY KEY,
+        question_id INTEGER REFERENCES questions(id) ON DELETE CASCADE,
+        text TEXT NOT NULL,
+        is_correct BOOLEAN NOT NULL DEFAULT FALSE
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_courses (
+        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+        course_id INTEGER REFERENCES courses(id) ON DELETE CASCADE,
+        PRIMARY KEY (user_id, course_id)
+    );
+    """,
+)
+
+# Счётчики курса (ученики, уроки), которые обновляются при записи
+sql_migration(2, "course_stats", CREATE_COURSE_STATS_TABLE)
+
+# Прогресс прохождения курса (пишется пачками из буфера progress_buffer)
+sql_migration(3, "user_course_progress", CREATE_PROGRESS_TABLE)
+
+# Индексы для выборки дерева курса: вопросы курса и ответы на вопрос
+sql_migration(
+    4,
+    "course tree indexes",
+    "CREATE INDEX IF NOT EXISTS idx_questions_course_id ON questions (course_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_answers_question_id ON answers (question_id, id)",
+)
+
+# Поиск по курсам: генерируемая колонка tsvector пересчитывается самим Postgres
+# при INSERT/UPDATE; триграммы по названию — для поиска с опечатками
+sql_migration(
+    5,
+    "course search",
+    """
+    ALTER TABLE courses ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_courses_search_vector ON courses USING GIN (search_vector)",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_courses_title_trgm ON courses USING GIN (title gin_trgm_ops)",
+)
+
+
+@migration(6, "move inline avatars to the avatar store")
+async def _move_inline_avatars(cur) -> None:
+    migrated = await migrate_inline_avatars(cur)
+    if migrated:
+        logger.info(f"Moved {migrated} inline avatars to the avatar store")
+
+
+@migration(7, "demo course")
+async def _add_demo_course(cur) -> None:
+    """Добавляет демо-курс, если его ещё нет."""
+    await cur.execute("SELECT id FROM courses WHERE title = %s", ("Основы Python (с тестом)",))
+    if await cur.fetchone() is not None:
+        return
+    # Список вопросов и ответов для демо-курса
+    demo_questions = [
+        ("Какая функция используется для вывода текста на экран?", [
+            ("print()", True), ("input()", False), ("scan()", False)
+        ]),
+        ("Какой символ используется для комментариев в Python?", [
+            ("#", True), ("//", False), ("--", False)
+        ]),
+        ("Что вернет выражение 3 * 'A'?", [
+            ("'AAA'", True), ("'3A'", False), ("Ошибка", False)
+        ])
+    ]
+    # insert_courses нужны только атрибуты CourseCreate, сами модели живут в main
+    demo_course = SimpleNamespace(
+        title="Основы Python (с тестом)",
+        description="Изучите основы языка Python с нуля. Переменные, циклы, функции.",
+        price=0,
+        questions=[
+            SimpleNamespace(
+                text=q_text,
+                answers=[SimpleNamespace(text=a_text, is_correct=is_correct) for a_text, is_correct in answers],
+            )
+            for q_text, answers in demo_questions
+        ],
+    )
+    await insert_courses(cur, [demo_course])
+    logger.info("Added demo course with questions")
+
+# Попытки прохождения тестов (проверка на сервере, см. grading.py)
+sql_migration(
+    8,
+    "quiz attempts",
+    CREATE_QUIZ_ATTEMPTS_TABLE,
+    CREATE_QUIZ_ATTEMPT_ANSWERS_TABLE,
+    "CREATE INDEX IF NOT EXISTS idx_quiz_attempts_user_course ON quiz_attempts (user_id, course_id)",
+)
+
+# Обратный индекс: ученики курса и их число без полного просмотра user_courses
+sql_migration(
+    9,
+    "user_courses course_id index",
+    "CREATE INDEX IF NOT EXISTS idx_user_courses_course_id ON user_courses (course_id, user_id)",
+)
+
+# Номера событий кэша: версии данных для ETag, общие для всех воркеров (events.py)
+sql_migration(10, "cache version sequence", "CREATE SEQUENCE IF NOT EXISTS cache_version_seq")
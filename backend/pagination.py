@@ -0,0 +1,53 @@
+import base64
+import binascii
+import json
+import os
+from fastapi import HTTPException, Response
+
+# Размер страницы по умолчанию и максимальный для списковых эндпоинтов
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+# Заголовок, в котором отдаём курсор следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    """Упаковывает позицию последней строки страницы в непрозрачный курсор."""
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str | None) -> int | None:
+    """Возвращает id, после которого начинается страница (None — с начала)."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        last_id = data["id"]
+    except (ValueError, KeyError, TypeError, UnicodeEncodeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Некорректный курсор страницы")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Некорректный курсор страницы")
+    return last_id
+
+
+def split_page(rows: list, limit: int, key=lambda row: row[0]) -> tuple[list, str | None]:
+    """Обрезает выборку из limit + 1 строк до страницы и возвращает курсор следующей.
+
+    Запрос должен выбирать на одну строку больше `limit`: её наличие означает,
+    что следующая страница существует.
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(key(rows[-1]))
+    return rows, None
+
+
+def paginate(rows: list, limit: int, response: Response, key=lambda row: row[0]) -> list:
+    """Как split_page, но курсор следующей страницы кладёт в заголовок X-Next-Cursor."""
+    rows, next_cursor = split_page(rows, limit, key)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
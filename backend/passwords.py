@@ -0,0 +1,148 @@
+"""Хэширование паролей в отдельном ограниченном пуле потоков.
+
+Используется scrypt из стандартной библиотеки: он медленный намеренно
+(десятки миллисекунд CPU) и отпускает GIL, поэтому считается в потоках пула
+и не блокирует event loop. Число задач в пуле и в очереди к нему ограничено:
+при всплеске логинов лишние запросы сразу получают HashingBusy (503), а не
+копятся в бесконечной очереди, замедляя остальные эндпоинты.
+
+Успешные проверки кэшируются ненадолго: повторный вход с тем же паролем при
+неизменном хэше не тратит CPU на scrypt. Ключ кэша — HMAC с секретом процесса,
+сам пароль в памяти не хранится.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from cache import AsyncLRUCache
+
+# Параметры scrypt (N — стоимость по CPU и памяти, степень двойки)
+PASSWORD_SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2 ** 14)))
+PASSWORD_SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+# Потоков для хэширования и сколько задач может ждать свободный поток
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+# Кэш успешных проверок пароля
+PASSWORD_VERIFY_CACHE_SIZE = int(os.getenv("PASSWORD_VERIFY_CACHE_SIZE", "10000"))
+PASSWORD_VERIFY_CACHE_TTL = float(os.getenv("PASSWORD_VERIFY_CACHE_TTL", "300"))
+
+_PREFIX = "scrypt"
+_SALT_BYTES = 16
+_KEY_BYTES = 32
+
+
+class HashingBusy(Exception):
+    """Пул хэширования и очередь к нему заполнены — запрос нужно повторить позже."""
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode("utf-8"), salt=salt, n=n, r=r, p=p, dklen=_KEY_BYTES, maxmem=256 * n * r + 1024 * 1024,
+    )
+
+
+def hash_password(password: str) -> str:
+    """Хэш в формате scrypt$n$r$p$salt$key (base64). Выполняется синхронно."""
+    salt = secrets.token_bytes(_SALT_BYTES)
+    key = _scrypt(password, salt, PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+    return f"{_PREFIX}${PASSWORD_SCRYPT_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}${_b64(salt)}${_b64(key)}"
+
+
+def is_hashed(stored: str) -> bool:
+    return stored.startswith(_PREFIX + "$")
+
+
+def _parse(stored: str) -> tuple[int, int, int, bytes, bytes]:
+    _, n, r, p, salt, key = stored.split("$")
+    return int(n), int(r), int(p), base64.b64decode(salt), base64.b64decode(key)
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """Сверяет пароль с хэшем. Выполняется синхронно."""
+    try:
+        n, r, p, salt, key = _parse(stored)
+    except ValueError:
+        return False
+    return hmac.compare_digest(_scrypt(password, salt, n, r, p), key)
+
+
+def needs_rehash(stored: str) -> bool:
+    """Хэш посчитан с другими параметрами scrypt, чем текущие."""
+    try:
+        n, r, p, _, _ = _parse(stored)
+    except ValueError:
+        return True
+    return (n, r, p) != (PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+
+
+class PasswordHasher:
+    """Асинхронный фасад над пулом потоков с ограничением очереди."""
+
+    def __init__(self, workers: int, max_queue: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.max_in_flight = workers + max_queue
+        self.in_flight = 0
+        self.rejected = 0
+        self._verified = AsyncLRUCache(PASSWORD_VERIFY_CACHE_SIZE, PASSWORD_VERIFY_CACHE_TTL)
+        self._cache_secret = secrets.token_bytes(32)
+
+    async def _run(self, fn, *args):
+        if self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            raise HashingBusy()
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        future = self._executor.submit(fn, *args)
+        # Счётчик уменьшаем, когда поток действительно закончил работу: отмена
+        # запроса не останавливает уже начатое хэширование.
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        return await asyncio.wrap_future(future)
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, stored: str) -> tuple[bool, str | None]:
+        """Проверяет пароль; возвращает (совпал ли, новый хэш для записи или None).
+
+        Новый хэш возвращается для паролей, хранившихся открытым текстом, и для
+        хэшей с устаревшими параметрами scrypt.
+        """
+        if not is_hashed(stored):
+            if not hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")):
+                return False, None
+            return True, await self.hash(password)
+
+        cache_key = hmac.new(self._cache_secret, f"{stored}\0{password}".encode("utf-8"), "sha256").digest()
+        if self._verified.get(cache_key):
+            self._verified.hits += 1
+            return True, None
+        self._verified.misses += 1
+        if not await self._run(verify_password, password, stored):
+            return False, None
+        self._verified.set(cache_key, True)
+        return True, (await self.hash(password) if needs_rehash(stored) else None)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "rejected": self.rejected,
+            "verify_cache": self._verified.stats(),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
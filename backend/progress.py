@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+import events
+from db import get_connection
+
+logger = logging.getLogger("uvicorn.error")
+
+# Как часто сбрасывать накопленный прогресс в БД (секунды)
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "2"))
+# При таком числе несброшенных пар (пользователь, курс) сбрасываем досрочно
+PROGRESS_FLUSH_MAX_PENDING = int(os.getenv("PROGRESS_FLUSH_MAX_PENDING", "1000"))
+
+CREATE_PROGRESS_TABLE = """
+    CREATE TABLE IF NOT EXISTS user_course_progress (
+        user_id INTEGER NOT NULL,
+        course_id INTEGER NOT NULL,
+        current_index INTEGER NOT NULL DEFAULT 0,
+        progress_percentage INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (user_id, course_id),
+        FOREIGN KEY (user_id, course_id) REFERENCES user_courses (user_id, course_id) ON DELETE CASCADE
+    );
+"""
+
+# Пакетный upsert. Пары без записи на курс отбрасываются JOIN-ом, чтобы одна
+# такая пара не откатила всю пачку нарушением внешнего ключа.
+_UPSERT_QUERY = """
+    INSERT INTO user_course_progress (user_id, course_id, current_index, progress_percentage, updated_at)
+    SELECT t.user_id, t.course_id, t.current_index, t.progress_percentage, t.updated_at
+    FROM unnest(%s::int[], %s::int[], %s::int[], %s::int[], %s::timestamptz[])
+         AS t(user_id, course_id, current_index, progress_percentage, updated_at)
+    JOIN user_courses uc ON uc.user_id = t.user_id AND uc.course_id = t.course_id
+    ON CONFLICT (user_id, course_id) DO UPDATE
+        SET current_index = EXCLUDED.current_index,
+            progress_percentage = EXCLUDED.progress_percentage,
+            updated_at = EXCLUDED.updated_at
+        WHERE user_course_progress.updated_at <= EXCLUDED.updated_at
+"""
+
+
+class ProgressBuffer:
+    """Буфер прогресса с отложенной записью (write-behind).
+
+    Обновления копятся в памяти и схлопываются по паре (user_id, course_id):
+    остаётся только последнее. В БД они уходят одним пакетным upsert по таймеру
+    или при достижении порога, а также при остановке приложения.
+    """
+
+    def __init__(self, flush_interval: float, max_pending: int):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: dict[tuple[int, int], tuple[int, int, datetime]] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self.flushed_rows = 0
+        self.flushes = 0
+
+    def add(self, user_id: int, course_id: int, current_index: int, progress_percentage: int) -> None:
+        self._pending[(user_id, course_id)] = (current_index, progress_percentage, datetime.now(timezone.utc))
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def pending(self, user_id: int, course_id: int) -> tuple[int, int] | None:
+        """Ещё не записанный в БД прогресс пары (current_index, progress_percentage)."""
+        entry = self._pending.get((user_id, course_id))
+        return entry[:2] if entry else None
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            keys = list(batch)
+            try:
+                async with get_connection() as conn:
+                    await conn.execute(
+                        _UPSERT_QUERY,
+                        (
+                            [k[0] for k in keys],
+                            [k[1] for k in keys],
+                            [batch[k][0] for k in keys],
+                            [batch[k][1] for k in keys],
+                            [batch[k][2] for k in keys],
+                        ),
+                    )
+                    # Другим воркерам — уведомление в той же транзакции, этому — dispatch ниже
+                    await events.publish(conn, events.USER, {k[0] for k in keys})
+            except BaseException:
+                # Возвращаем пачку в буфер, не затирая более свежие обновления
+                for key, value in batch.items():
+                    self._pending.setdefault(key, value)
+                raise
+            # Прогресс уже в БД: следующие чтения этих пользователей — с основной БД
+            events.dispatch(events.USER, {k[0] for k in keys})
+            self.flushes += 1
+            self.flushed_rows += len(keys)
+            return len(keys)
+
+    async def run(self) -> None:
+        """Фоновая задача: сбрасывает буфер по таймеру или по порогу размера."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush course progress")
+
+
+progress_buffer = ProgressBuffer(PROGRESS_FLUSH_INTERVAL, PROGRESS_FLUSH_MAX_PENDING)
@@ -0,0 +1,21 @@
+import orjson
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+
+def dumps(content) -> bytes:
+    """Сериализует в JSON (UTF-8) через orjson."""
+    return orjson.dumps(content)
+
+
+def fast_json(content, response: Response | None = None, status_code: int = 200) -> ORJSONResponse:
+    """Готовый JSON-ответ из доверенных данных (строк БД).
+
+    Возвращённый Response FastAPI отдаёт как есть: без повторной валидации через
+    response_model и без прохода jsonable_encoder. Заголовки, выставленные
+    обработчиком во временный `response` (ETag, X-Next-Cursor), переносятся.
+    """
+    headers = None
+    if response is not None:
+        headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
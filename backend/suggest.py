@@ -0,0 +1,135 @@
+"""Подсказки названий курсов по префиксу из индекса в памяти процесса.
+
+Индекс — два отсортированных массива ключей: названия целиком и отдельные
+слова названий, приведённые casefold (ё считается за е). Поиск префикса —
+бинарный поиск и просмотр подряд идущих ключей до набора `limit` курсов,
+то есть O(log n + limit) без обращения к БД.
+
+Индекс строится при старте. Новые курсы этого воркера добавляются сразу
+после коммита, курсы других воркеров и импорта — по событию COURSE
+(events.py) одним запросом за их названиями.
+"""
+import asyncio
+import bisect
+import logging
+import os
+import re
+import events
+from db import get_cursor
+
+logger = logging.getLogger("uvicorn.error")
+
+# Сколько подсказок отдавать по умолчанию и максимум
+SUGGEST_DEFAULT_LIMIT = int(os.getenv("SUGGEST_DEFAULT_LIMIT", "10"))
+SUGGEST_MAX_LIMIT = int(os.getenv("SUGGEST_MAX_LIMIT", "50"))
+# При добавлении стольких курсов разом массивы пересортировываются целиком
+_REBUILD_THRESHOLD = 1000
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    return text.casefold().replace("ё", "е")
+
+
+def _scan(entries: list[tuple[str, int]], prefix: str, limit: int, found: dict[int, None]) -> None:
+    i = bisect.bisect_left(entries, (prefix,))
+    while i < len(entries) and len(found) < limit:
+        key, course_id = entries[i]
+        if not key.startswith(prefix):
+            break
+        found.setdefault(course_id)
+        i += 1
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.titles: dict[int, str] = {}
+        # Пары (ключ, id курса), отсортированные по ключу
+        self._by_title: list[tuple[str, int]] = []
+        self._by_word: list[tuple[str, int]] = []
+        self._pending: set[asyncio.Task] = set()
+
+    def _entries(self, course_id: int, title: str) -> tuple[tuple[str, int], list[tuple[str, int]]]:
+        key = normalize(title)
+        words = set(_WORD_RE.findall(key))
+        return (key, course_id), [(w, course_id) for w in words]
+
+    def build(self, rows) -> None:
+        """Строит индекс заново из пар (id, title)."""
+        titles = {course_id: title for course_id, title in rows}
+        by_title, by_word = [], []
+        for course_id, title in titles.items():
+            title_entry, word_entries = self._entries(course_id, title)
+            by_title.append(title_entry)
+            by_word.extend(word_entries)
+        by_title.sort()
+        by_word.sort()
+        self.titles, self._by_title, self._by_word = titles, by_title, by_word
+
+    def add(self, rows) -> None:
+        """Добавляет курсы (пары (id, title)); название курса не меняется после создания."""
+        rows = [(course_id, title) for course_id, title in rows if course_id not in self.titles]
+        if len(rows) >= _REBUILD_THRESHOLD:
+            self.build([*self.titles.items(), *rows])
+            return
+        for course_id, title in rows:
+            title_entry, word_entries = self._entries(course_id, title)
+            self.titles[course_id] = title
+            bisect.insort(self._by_title, title_entry)
+            for entry in word_entries:
+                bisect.insort(self._by_word, entry)
+
+    def lookup(self, prefix: str, limit: int) -> list[dict]:
+        """Курсы, у которых название или одно из слов названия начинается с `prefix`.
+
+        Сначала совпадения по началу названия, затем по словам; внутри — по алфавиту.
+        """
+        prefix = normalize(prefix.strip())
+        if not prefix:
+            return []
+        found: dict[int, None] = {}
+        _scan(self._by_title, prefix, limit, found)
+        _scan(self._by_word, prefix, limit, found)
+        return [{"id": course_id, "title": self.titles[course_id]} for course_id in found]
+
+    async def load(self) -> None:
+        async with get_cursor() as cur:
+            await cur.execute("SELECT id, title FROM courses")
+            rows = await cur.fetchall()
+        # Курсы, добавленные во время загрузки, не теряем: курсы не удаляются и не переименовываются
+        self.build([*rows, *self.titles.items()])
+        logger.info(f"Suggest index built: {len(self.titles)} courses")
+
+    async def _load_titles(self, course_ids: list[int]) -> None:
+        async with get_cursor() as cur:
+            await cur.execute("SELECT id, title FROM courses WHERE id = ANY(%s)", (course_ids,))
+            self.add(await cur.fetchall())
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Failed to update suggest index", exc_info=task.exception())
+
+    def stats(self) -> dict:
+        return {"courses": len(self.titles), "words": len(self._by_word)}
+
+
+suggest_index = SuggestIndex()
+
+
+@events.subscribe(events.COURSE)
+def _on_courses(ids: list[int]) -> None:
+    missing = [course_id for course_id in ids if course_id not in suggest_index.titles]
+    if missing:
+        suggest_index._spawn(suggest_index._load_titles(missing))
+
+
+@events.subscribe(events.RESET)
+def _on_reset(ids: list[int]) -> None:
+    suggest_index._spawn(suggest_index.load())
@@ -0,0 +1,125 @@
+import time
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+import auth
+from auth import AuthMiddleware, TokenError, issue_token, issue_tokens, verify_token
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    """Два ключа: активный new и старый old, который ещё принимается."""
+    monkeypatch.setattr(auth, "_ACTIVE_KID", "new")
+    monkeypatch.setattr(auth, "_ACTIVE_KEY", b"new-secret")
+    monkeypatch.setattr(auth, "_KEYS_BY_ID", {"new": b"new-secret", "old": b"old-secret"})
+
+
+def _reissue_with(monkeypatch, kid: str, key: bytes, *args) -> str:
+    with monkeypatch.context() as m:
+        m.setattr(auth, "_ACTIVE_KID", kid)
+        m.setattr(auth, "_ACTIVE_KEY", key)
+        return issue_token(*args)
+
+
+def test_roundtrip(keys):
+    tokens = issue_tokens(42)
+    assert verify_token(tokens["access_token"], "access") == 42
+    assert verify_token(tokens["refresh_token"], "refresh") == 42
+    assert tokens["expires_in"] == auth.ACCESS_TOKEN_TTL
+
+
+def test_wrong_type(keys):
+    tokens = issue_tokens(42)
+    with pytest.raises(TokenError, match="wrong type"):
+        verify_token(tokens["access_token"], "refresh")
+    with pytest.raises(TokenError, match="wrong type"):
+        verify_token(tokens["refresh_token"], "access")
+
+
+def test_expired(keys, monkeypatch):
+    token = issue_token(42, "access", 10)
+    now = time.time()
+    monkeypatch.setattr(auth.time, "time", lambda: now + 11)
+    with pytest.raises(TokenError, match="expired"):
+        verify_token(token, "access")
+
+
+def test_rotated_key_still_accepted(keys, monkeypatch):
+    token = _reissue_with(monkeypatch, "old", b"old-secret", 7, "access", 60)
+    assert verify_token(token, "access") == 7
+
+
+def test_unknown_kid(keys, monkeypatch):
+    token = _reissue_with(monkeypatch, "gone", b"gone-secret", 7, "access", 60)
+    with pytest.raises(TokenError, match="unknown key"):
+        verify_token(token, "access")
+
+
+def test_unknown_version(keys):
+    token = issue_token(7, "access", 60)
+    with pytest.raises(TokenError, match="unknown key"):
+        verify_token("v2" + token[2:], "access")
+
+
+def test_tampered_payload(keys):
+    version, kid, _, signature = issue_token(7, "access", 60).split(".")
+    forged = auth._b64encode(b'{"sub":1,"typ":"access","iat":0,"exp":9999999999}')
+    with pytest.raises(TokenError, match="bad signature"):
+        verify_token(f"{version}.{kid}.{forged}.{signature}", "access")
+
+
+def test_signature_from_other_key(keys, monkeypatch):
+    # Тот же kid, но подписано чужим секретом
+    token = _reissue_with(monkeypatch, "new", b"attacker-secret", 7, "access", 60)
+    with pytest.raises(TokenError, match="bad signature"):
+        verify_token(token, "access")
+
+
+@pytest.mark.parametrize("token", [
+    "",
+    "garbage",
+    "a.b.c",
+    "v1.new.x.y.z",
+    "v1.new.ab.\xe9",
+    "v1.néw.ab.cd",
+    "v1.new.пр.cd",
+])
+def test_malformed(keys, token):
+    with pytest.raises(TokenError):
+        verify_token(token, "access")
+
+
+def test_signed_garbage_payload(keys):
+    # Корректная подпись, но payload — не JSON нужного вида
+    for raw in (b"not json", b"[]", b'{"sub":1}', b'{"sub":1,"typ":"access","exp":"soon"}'):
+        body = auth._b64encode(raw)
+        message = f"v1.new.{body}".encode("ascii")
+        token = f"v1.new.{body}.{auth._sign(b'new-secret', message).decode('ascii')}"
+        with pytest.raises(TokenError):
+            verify_token(token, "access")
+
+
+def _client() -> TestClient:
+    async def whoami(request):
+        return JSONResponse({"user_id": request.state.user_id})
+
+    app = Starlette(routes=[Route("/whoami", whoami)])
+    app.add_middleware(AuthMiddleware)
+    return TestClient(app)
+
+
+def test_middleware_sets_user(keys):
+    client = _client()
+    token = issue_tokens(5)["access_token"]
+    assert client.get("/whoami", headers={"Authorization": f"Bearer {token}"}).json() == {"user_id": 5}
+    assert client.get("/whoami").json() == {"user_id": None}
+
+
+@pytest.mark.parametrize("header", [b"Bearer v1.new.ab.\xe9", b"Bearer \xff\xfe", b"Basic abc", b"Bearer"])
+def test_middleware_ignores_bad_tokens(keys, header):
+    client = _client()
+    response = client.get("/whoami", headers=[(b"authorization", header)])
+    assert response.status_code == 200
+    assert response.json() == {"user_id": None}
@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+from cache import AsyncLRUCache
+
+
+def test_single_flight():
+    cache = AsyncLRUCache(10, 60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return b"value"
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load(1, loader) for _ in range(5)))
+
+    assert asyncio.run(run()) == [b"value"] * 5
+    assert calls == 1
+    assert cache.get(1) == b"value"
+
+
+def test_cancelled_leader_does_not_fail_followers():
+    cache = AsyncLRUCache(10, 60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return b"value"
+
+    async def run():
+        leader = asyncio.create_task(cache.get_or_load(1, loader))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_load(1, loader))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == b"value"
+    assert calls == 2
+
+
+def test_cancelled_follower_does_not_cancel_load():
+    cache = AsyncLRUCache(10, 60)
+
+    async def loader():
+        await asyncio.sleep(0.02)
+        return b"value"
+
+    async def run():
+        leader = asyncio.create_task(cache.get_or_load(1, loader))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_load(1, loader))
+        await asyncio.sleep(0.005)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(run()) == b"value"
+
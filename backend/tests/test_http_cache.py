@@ -0,0 +1,144 @@
+import asyncio
+import json
+import pytest
+import events
+from http_cache import VersionTracker, etag_matches
+
+# Обработчики модулей, подписанных на события (events и его импорты)
+_HANDLERS = events._handlers
+
+
+def _notify(kind: str, ids: list[int], version: int, origin: str = "other-worker") -> str:
+    return json.dumps({"origin": origin, "kind": kind, "ids": ids, "version": version})
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = VersionTracker()
+    monkeypatch.setattr(events, "versions", tracker)
+    monkeypatch.setattr(events, "_handlers", {})
+    return tracker
+
+
+def test_unique_until_synced():
+    tracker = VersionTracker()
+    assert tracker.catalog_etag() != tracker.catalog_etag()
+    assert tracker.course_etag(1) != tracker.course_etag(1)
+
+
+def test_workers_agree_after_sync():
+    a, b = VersionTracker(), VersionTracker()
+    a.sync(10)
+    b.sync(10)
+    assert a.catalog_etag() == b.catalog_etag()
+    assert a.course_etag(1) == b.course_etag(1)
+    assert a.bootstrap_etag(5) == b.bootstrap_etag(5)
+    assert a.course_etag(1) != a.course_etag(2)
+
+
+def test_workers_agree_on_event_version():
+    a, b = VersionTracker(), VersionTracker()
+    a.sync(10)
+    b.sync(20)
+    assert a.course_etag(1) != b.course_etag(1)
+    a.bump_course(1, 15)
+    b.bump_course(1, 15)
+    assert a.course_etag(1) == b.course_etag(1)
+
+
+def test_floor_differs_from_event_with_same_number():
+    # floor может включать номер ещё не закоммиченного события
+    a, b = VersionTracker(), VersionTracker()
+    a.sync(11)
+    b.sync(10)
+    b.bump_user(7, 11)
+    assert a.user_courses_etag(7) != b.user_courses_etag(7)
+
+
+def test_local_write_unique_until_event_arrives():
+    tracker = VersionTracker()
+    tracker.sync(10)
+    before = tracker.user_courses_etag(7)
+    tracker.bump_user(7)
+    dirty = tracker.user_courses_etag(7)
+    assert dirty not in (before, tracker.user_courses_etag(7))
+    tracker.bump_user(7, 11)
+    assert tracker.user_courses_etag(7) == tracker.user_courses_etag(7) != before
+
+
+def test_last_event_wins_not_largest():
+    # Номера выдаются до коммита, а события приходят в порядке коммитов
+    tracker = VersionTracker()
+    tracker.sync(0)
+    tracker.bump_catalog(12)
+    after_12 = tracker.catalog_etag()
+    tracker.bump_catalog(11)
+    assert tracker.catalog_etag() != after_12
+
+
+def test_catalog_change_changes_user_etags():
+    tracker = VersionTracker()
+    tracker.sync(0)
+    user_courses, bootstrap = tracker.user_courses_etag(7), tracker.bootstrap_etag(7)
+    tracker.bump_catalog(1)
+    assert tracker.user_courses_etag(7) != user_courses
+    assert tracker.bootstrap_etag(7) != bootstrap
+
+
+def test_reset_makes_etags_unique():
+    tracker = VersionTracker()
+    tracker.sync(10)
+    tracker.reset()
+    assert tracker.catalog_etag() != tracker.catalog_etag()
+
+
+def test_notify_applies_version(tracker):
+    tracker.sync(0)
+    events._handle_notify(_notify(events.COURSE, [3, 4], 5))
+    events._handle_notify(_notify(events.USER, [7], 6, origin=events._ORIGIN))
+    other = VersionTracker()
+    other.sync(0)
+    other.bump_course(3, 5)
+    other.bump_user(7, 6)
+    assert tracker.course_etag(3) == other.course_etag(3)
+    assert tracker.course_etag(4) != tracker.course_etag(3)
+    assert tracker.user_courses_etag(7) == other.user_courses_etag(7)
+
+
+class _Cursor:
+    async def execute(self, query, params=None):
+        pass
+
+
+@pytest.mark.parametrize("notify_first", [True, False])
+def test_own_write_settles_on_event_version(tracker, monkeypatch, notify_first):
+    # Своё уведомление может прийти и до, и после dispatch() после коммита
+    monkeypatch.setattr(events, "_handlers", _HANDLERS)
+    tracker.sync(10)
+    before = tracker.user_courses_etag(7)
+    asyncio.run(events.publish(_Cursor(), events.USER, [7]))
+    assert tracker.user_courses_etag(7) != tracker.user_courses_etag(7)
+    if notify_first:
+        events._handle_notify(_notify(events.USER, [7], 11, origin=events._ORIGIN))
+        events.dispatch(events.USER, [7])
+    else:
+        events.dispatch(events.USER, [7])
+        events._handle_notify(_notify(events.USER, [7], 11, origin=events._ORIGIN))
+    etag = tracker.user_courses_etag(7)
+    assert etag == tracker.user_courses_etag(7) != before
+
+
+def test_malformed_notify_ignored(tracker):
+    tracker.sync(0)
+    etag = tracker.catalog_etag()
+    events._handle_notify("not json")
+    events._handle_notify(json.dumps({"origin": "x", "kind": events.CATALOG, "ids": []}))
+    assert tracker.catalog_etag() == etag
+
+
+def test_etag_matches():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches('W/"b"', '"b"')
+    assert etag_matches("*", '"b"')
+    assert not etag_matches(None, '"b"')
+    assert not etag_matches('"a"', '"b"')
@@ -1,12 +1,113 @@
+import axios from "axios";
+
 // Если VITE_API_URL пустой, берем корень сайта. 
 // В Coolify лучше оставить пустым или поставить '/', так как Nginx сам все разрулит.
 export const API_URL = import.meta.env.VITE_API_URL || (typeof window !== 'undefined' ? window.location.origin : '');
 
 const getBase = () => API_URL.replace(/\/$/, '');
 
-export async function getUsers() {
+// --- Сессия: подписанные токены от /auth/login и /auth/register ---
+// Профиль хранится в currentUser, токены — отдельно, чтобы обновление профиля их не затирало
+const TOKENS_KEY = 'authTokens';
+
+interface AuthTokens {
+  access_token: string;
+  refresh_token: string;
+}
+
+function readTokens(): AuthTokens | null {
+  try {
+    const raw = localStorage.getItem(TOKENS_KEY);
+    return raw ? JSON.parse(raw) : null;
+  } catch {
+    return null;
+  }
+}
+
+// Сохраняет ответ /auth/login или /auth/register и возвращает профиль пользователя
+export function saveSession(data: any) {
+  const { access_token, refresh_token, token_type, expires_in, ...user } = data;
+  localStorage.setItem('currentUser', JSON.stringify(user));
+  if (access_token && refresh_token) {
+    localStorage.setItem(TOKENS_KEY, JSON.stringify({ access_token, refresh_token }));
+  }
+  return user;
+}
+
+export function clearSession() {
+  localStorage.removeItem('currentUser');
+  localStorage.removeItem(TOKENS_KEY);
+}
+
+export function authHeaders(): Record<string, string> {
+  const tokens = readTokens();
+  return tokens ? { Authorization: `Bearer ${tokens.access_token}` } : {};
+}
+
+// Одновременные 401 ждут одно обновление токенов
+let refreshing: Promise<boolean> | null = null;
+
+export function refreshSession(): Promise<boolean> {
+  if (!refreshing) {
+    refreshing = (async () => {
+      const tokens = readTokens();
+      if (!tokens) return false;
+      try {
+        const res = await fetch(`${getBase()}/auth/refresh`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ refresh_token: tokens.refresh_token }),
+        });
+        if (!res.ok) {
+          clearSession();
+          return false;
+        }
+        const fresh = await res.json();
+        localStorage.setItem(TOKENS_KEY, JSON.stringify({ access_token: fresh.access_token, refresh_token: fresh.refresh_token }));
+        return true;
+      } catch {
+        return false;
+      } finally {
+        refreshing = null;
+      }
+    })();
+  }
+  return refreshing;
+}
+
+// fetch с токеном; при истёкшем access-токене один раз обновляет его и повторяет запрос
+export async function authFetch(input: string, init: RequestInit = {}) {
+  const withAuth = () => fetch(input, { ...init, headers: { ...(init.headers || {}), ...authHeaders() } });
+  const res = await withAuth();
+  if (res.status === 401 && await refreshSession()) {
+    return withAuth();
+  }
+  return res;
+}
+
+// То же для axios: токен в каждом запросе, повтор после обновления при 401
+axios.interceptors.request.use((config) => {
+  const headers = authHeaders();
+  if (headers.Authorization && !config.headers.Authorization) {
+    config.headers.Authorization = headers.Authorization;
+  }
+  return config;
+});
+
+axios.interceptors.response.use(undefined, async (error) => {
+  const config = error.config as any;
+  if (error.response?.status === 401 && config && !config._authRetry && await refreshSession()) {
+    config._authRetry = true;
+    config.headers.Authorization = authHeaders().Authorization;
+    return axios(config);
+  }
+  return Promise.reject(error);
+});
+
+// Список пользователей — служебный эндпоинт, нужен токен администратора (X-Admin-Token)
+export async function getUsers(adminToken: string) {
   // Добавляем /api/, чтобы Nginx перекинул запрос на бэкенд
-  const res = await fetch(`${getBase()}/api/users`); 
+  const res = await fetch(`${getBase()}/api/users`, { headers: { 'X-Admin-Token': adminToken } });
   if (!res.ok) {
     throw new Error("Failed to fetch users");
   }
@@ -39,3 +140,21 @@ export async function fetchCourses(query?: string, timestamp?: number) {
     throw e;
   }
 }
+
+// Подсказки для строки поиска: id и названия курсов по началу названия или слова
+export async function fetchSuggestions(prefix: string, signal?: AbortSignal): Promise<{ id: number; title: string }[]> {
+  const url = new URL(`${getBase()}/api/v1/courses/suggest`, window.location.origin);
+  url.searchParams.set('prefix', prefix);
+  const res = await fetch(url.toString(), { signal });
+  if (!res.ok) throw new Error(`Error: ${res.status}`);
+  return res.json();
+}
+
+// Следующая страница постраничного списка (/v1/courses, /v1/users/{id}/courses):
+// курсор берётся из ответа предыдущей страницы, следующий — из заголовка X-Next-Cursor
+export async function fetchNextPage<T>(path: string, after: string): Promise<{ items: T[]; next: string | null }> {
+  const url = new URL(`${getBase()}/api${path}`, window.location.origin);
+  url.searchParams.set('after', after);
+  const res = await axios.get<T[]>(url.toString(), { timeout: 8000 });
+  return { items: Array.isArray(res.data) ? res.data : [], next: res.headers['x-next-cursor'] || null };
+}
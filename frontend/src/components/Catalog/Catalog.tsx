@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from "react";
 import axios from "axios";
-import { fetchCourses, API_URL } from "../../api/api";
+import { fetchCourses, fetchNextPage, fetchSuggestions, API_URL } from "../../api/api";
 import { Link, useLocation } from "react-router-dom";
 import Header from "../Header/Header";
 import Sidebar from "../Sidebar/sidebar";
@@ -58,7 +58,11 @@ export default function Catalog({ theme, toggleTheme }: { theme: "dark" | "light
   const [searchTerm, setSearchTerm] = useState("");
   const [debouncedTerm, setDebouncedTerm] = useState("");
   const [searchLoading, setSearchLoading] = useState(false);
+  const [suggestions, setSuggestions] = useState<{ id: number; title: string }[]>([]);
   const [myCourseIds, setMyCourseIds] = useState<Set<number>>(new Set());
+  // Курсор следующей страницы каталога (null — загружено всё)
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const isDark = theme === "dark";
   const location = useLocation();
@@ -66,22 +70,24 @@ export default function Catalog({ theme, toggleTheme }: { theme: "dark" | "light
   useEffect(() => {
     const load = async () => {
       try {
-        const ts = Date.now();
         const base = API_URL.replace(/\/$/, "");
-        const all = await fetchCourses(undefined, ts).catch(() => axios.get(`${base}/api/v1/courses?_t=${ts}`, { timeout: 8000 }).then(r => r.data));
-
         const userRaw = localStorage.getItem("currentUser");
         const user = userRaw ? JSON.parse(userRaw) : null;
-        let myIds = new Set<number>();
-        if (user && user.id) {
-          const resp = await axios.get(`${base}/api/v1/users/${user.id}/courses?_t=${ts}`, { timeout: 8000 }).catch(() => ({ data: [] }));
-          myIds = new Set((resp.data || []).map((c: any) => c.id));
-        }
+
+        // Каталог и курсы пользователя приходят одним запросом
+        const url = user && user.id ? `${base}/api/v1/bootstrap?user_id=${user.id}` : `${base}/api/v1/bootstrap`;
+        const data = await axios.get(url, { timeout: 8000 })
+          .then(r => r.data)
+          .catch(() => fetchCourses().then(courses => ({ courses, enrolled_course_ids: [] })));
+        const all = data.courses || [];
+        // Полный список id курсов пользователя, а не только первая страница user_courses
+        const myIds = new Set<number>(data.enrolled_course_ids || []);
 
         setMyCourseIds(myIds);
         const withStatus = (all as Course[]).map(c => ({ ...c, price_status: myIds.has(c.id) ? "Enrolled" : c.price_status }));
         setCourses(withStatus);
         setDisplayedCourses(withStatus);
+        setNextCursor(data.courses_next_cursor || null);
       } catch (e: any) {
         setError(String(e?.message || e));
       } finally {
@@ -91,8 +97,35 @@ export default function Catalog({ theme, toggleTheme }: { theme: "dark" | "light
     load();
   }, [location]);
 
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const page = await fetchNextPage<Course>("/v1/courses", nextCursor);
+      const more = page.items.map(c => ({ ...c, price_status: myCourseIds.has(c.id) ? "Enrolled" : c.price_status }));
+      setCourses(prev => [...prev, ...more]);
+      setNextCursor(page.next);
+    } catch (e) {
+      console.warn('Failed to load more courses', e);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => { const t = setTimeout(() => setDebouncedTerm(searchTerm), 300); return () => clearTimeout(t); }, [searchTerm]);
 
+  // Подсказки отвечают из памяти сервера, поэтому запрашиваем их почти на каждый символ;
+  // полнотекстовый поиск по-прежнему идёт после паузы в наборе
+  useEffect(() => {
+    const term = searchTerm.trim();
+    if (!term) { setSuggestions([]); return; }
+    const controller = new AbortController();
+    const t = setTimeout(() => {
+      fetchSuggestions(term, controller.signal).then(setSuggestions).catch(() => {});
+    }, 50);
+    return () => { clearTimeout(t); controller.abort(); };
+  }, [searchTerm]);
+
   useEffect(() => {
     if (debouncedTerm == null) return;
     const doSearch = async () => {
@@ -104,9 +137,8 @@ export default function Catalog({ theme, toggleTheme }: { theme: "dark" | "light
       setSearchLoading(true);
 
       try {
-        const ts = Date.now();
         const base = API_URL.replace(/\/$/, "");
-        const server = await fetchCourses(term, ts).catch(() => axios.get(`${base}/api/v1/courses?q=${encodeURIComponent(term)}&_t=${ts}`, { timeout: 8000 }).then(r => r.data));
+        const server = await fetchCourses(term).catch(() => axios.get(`${base}/api/v1/courses?q=${encodeURIComponent(term)}`, { timeout: 8000 }).then(r => r.data));
         const seen = new Set<number>();
         const unique: Course[] = [];
         for (const it of (server as Course[])) {
@@ -134,7 +166,8 @@ export default function Catalog({ theme, toggleTheme }: { theme: "dark" | "light
             <div className="content-header">
               <h1 className="main-title">Каталог курсов</h1>
               <div style={{ display: 'flex', gap: 8, alignItems: 'center' }}>
-                <input placeholder="Поиск курсов по названию или описанию" value={searchTerm} onChange={e => setSearchTerm(e.target.value)} style={{ padding: '8px 12px', borderRadius: 6, border: '1px solid #ccc' }} />
+                <input placeholder="Поиск курсов по названию или описанию" list="course-suggestions" value={searchTerm} onChange={e => setSearchTerm(e.target.value)} style={{ padding: '8px 12px', borderRadius: 6, border: '1px solid #ccc' }} />
+                <datalist id="course-suggestions">{suggestions.map(s => <option key={s.id} value={s.title} />)}</datalist>
                 <button className="theme-toggle-btn" onClick={toggleTheme} />
               </div>
             </div>
@@ -146,6 +179,12 @@ export default function Catalog({ theme, toggleTheme }: { theme: "dark" | "light
               <>
                 {searchLoading && <div className="loading-state">Поиск...</div>}
                 <div className="course-list">{displayedCourses.map(c => <CourseCard key={c.id} course={c} />)}</div>
+                {/* При поиске сервер отдаёт лучшие совпадения сразу, страницы — только у полного каталога */}
+                {nextCursor && !debouncedTerm.trim() && (
+                  <button className="start-button" type="button" onClick={loadMore} disabled={loadingMore} style={{ marginTop: 16 }}>
+                    {loadingMore ? "Загрузка..." : "Показать ещё"}
+                  </button>
+                )}
               </>
             )}
           </div>
@@ -12,7 +12,6 @@ import "./StyleCourseDetail.css"; // Специфичные стили для э
 interface Answer {
     id: number;
     text: string;
-    is_correct: boolean;
 }
 
 interface Question {
@@ -21,6 +20,13 @@ interface Question {
     answers: Answer[];
 }
 
+// Результат проверки попытки на сервере (POST /v1/courses/{id}/attempts)
+interface AttemptResult {
+    attempt_id: number;
+    score: number;
+    total: number;
+}
+
 interface CourseDetailData {
     id: number;
     title: string;
@@ -49,9 +55,9 @@ function CourseDetail({ theme, toggleTheme }: CourseDetailProps) {
 
     // Состояния для прохождения теста
     const [activeQuestionIndex, setActiveQuestionIndex] = useState<number | null>(null);
-    const [selectedAnswerId, setSelectedAnswerId] = useState<number | null>(null);
-    const [isAnswerChecked, setIsAnswerChecked] = useState(false);
-    const [correctAnswersCount, setCorrectAnswersCount] = useState(0);
+    // Выбранные ответы: id вопроса -> id ответа; проверяются на сервере в конце теста
+    const [selectedAnswers, setSelectedAnswers] = useState<Record<number, number>>({});
+    const [submitting, setSubmitting] = useState(false);
     const [lastResult, setLastResult] = useState<{ correct: number; total: number } | null>(null);
     const [isEnrolled, setIsEnrolled] = useState(false);
     const [showPayment, setShowPayment] = useState(false);
@@ -69,13 +75,9 @@ function CourseDetail({ theme, toggleTheme }: CourseDetailProps) {
                 if (userStr) {
                     try {
                         const user = JSON.parse(userStr);
-                        // Проверяем, записан ли пользователь на курс (через API)
-                        axios.get(`${base}/api/v1/users/${user.id}/courses`)
-                            .then(res => {
-                                if (Array.isArray(res.data) && res.data.some((c: any) => c.id === courseData.id)) {
-                                    setIsEnrolled(true);
-                                }
-                            })
+                        // Проверяем, записан ли пользователь на курс: 404 — не записан
+                        axios.get(`${base}/api/v1/users/${user.id}/courses/${courseData.id}`)
+                            .then(() => setIsEnrolled(true))
                             .catch(() => {});
 
                         const progMap = user.enrolledProgress || {};
@@ -87,8 +89,8 @@ function CourseDetail({ theme, toggleTheme }: CourseDetailProps) {
                             } else if (saved.currentIndex < courseData.questions.length) {
                                 setActiveQuestionIndex(saved.currentIndex);
                             }
-                            if (typeof saved.correctAnswers === 'number') {
-                                setCorrectAnswersCount(saved.correctAnswers);
+                            if (saved.answers && typeof saved.answers === 'object') {
+                                setSelectedAnswers(saved.answers);
                             }
                         }
                     } catch (e) {
@@ -121,11 +123,15 @@ function CourseDetail({ theme, toggleTheme }: CourseDetailProps) {
 
                     // Обновим локально информацию о записях пользователя и прогрессе
                     try {
-                        const resp = await axios.get(`${base}/api/v1/users/${user.id}/courses`);
-                        const enrolledIds = Array.isArray(resp.data) ? resp.data.map((c: any) => c.id) : [];
+                        await axios.get(`${base}/api/v1/users/${user.id}/courses/${course.id}`);
+                        const enrolledIds: number[] = user.enrolledCourseIds || [];
                         const progMap = user.enrolledProgress || {};
                         progMap[String(course.id)] = { currentIndex: 0, progress_percentage: 0 };
-                        const updatedUser = { ...user, enrolledCourseIds: enrolledIds, enrolledProgress: progMap };
+                        const updatedUser = {
+                            ...user,
+                            enrolledCourseIds: enrolledIds.includes(course.id) ? enrolledIds : [...enrolledIds, course.id],
+                            enrolledProgress: progMap,
+                        };
                         localStorage.setItem("currentUser", JSON.stringify(updatedUser));
                         setIsEnrolled(true);
                     } catch (e2) {
@@ -140,10 +146,8 @@ function CourseDetail({ theme, toggleTheme }: CourseDetailProps) {
                 }
             }
 
-            setCorrectAnswersCount(0);
+            setSelectedAnswers({});
             setActiveQuestionIndex(0);
-            setIsAnswerChecked(false);
-            setSelectedAnswerId(null);
             setLastResult(null); // Сбрасываем предыдущий результат
         } else {
             alert("В этом курсе пока нет вопросов.");
@@ -175,70 +179,68 @@ function CourseDetail({ theme, toggleTheme }: CourseDetailProps) {
         startLearning();
     };
 
-    const checkAnswer = () => {
-        if (selectedAnswerId !== null) {
-            setIsAnswerChecked(true);
-            if (course && activeQuestionIndex !== null) {
-                const question = course.questions[activeQuestionIndex];
-                const answer = question.answers.find(a => a.id === selectedAnswerId);
-                if (answer?.is_correct) {
-                    setCorrectAnswersCount(prev => prev + 1);
-                }
-            }
+    const selectAnswer = (questionId: number, answerId: number) => {
+        setSelectedAnswers(prev => ({ ...prev, [questionId]: answerId }));
+    };
+
+    // Сохраняем прогресс в localStorage и на бэкенде
+    const saveProgress = (currentIndex: number, percent: number, answers: Record<number, number>, correctAnswers?: number) => {
+        if (!course) return;
+        const userStr = localStorage.getItem('currentUser');
+        if (!userStr) return;
+        try {
+            const user = JSON.parse(userStr);
+            const base = API_URL.replace(/\/$/, '');
+            const progMap = user.enrolledProgress || {};
+            progMap[String(course.id)] = { currentIndex, progress_percentage: percent, answers, correctAnswers };
+            const updatedUser = { ...user, enrolledProgress: progMap };
+            localStorage.setItem('currentUser', JSON.stringify(updatedUser));
+            axios.post(`${base}/api/v1/users/${user.id}/courses/${course.id}/progress`, {
+                currentIndex,
+                progress_percentage: percent
+            }).catch(() => {});
+        } catch (e) {
+            console.warn('Не удалось сохранить прогресс', e);
+        }
+    };
+
+    // Отправляем все ответы одной попыткой — правильность проверяет сервер
+    const submitAttempt = async () => {
+        if (!course) return;
+        const base = API_URL.replace(/\/$/, '');
+        const userStr = localStorage.getItem('currentUser');
+        const userId = userStr ? JSON.parse(userStr).id : undefined;
+        setSubmitting(true);
+        try {
+            const response = await axios.post<AttemptResult>(`${base}/api/v1/courses/${course.id}/attempts`, {
+                user_id: userId,
+                answers: Object.entries(selectedAnswers).map(([questionId, answerId]) => ({
+                    question_id: Number(questionId),
+                    answer_id: answerId
+                }))
+            });
+            const { score, total } = response.data;
+            setLastResult({ correct: score, total });
+            // Отметим курс как завершённый (100%)
+            saveProgress(course.questions.length, 100, {}, score);
+            setActiveQuestionIndex(null); // Возврат к описанию
+        } catch (e) {
+            console.error('Не удалось отправить ответы', e);
+            alert('Не удалось отправить ответы. Попробуйте ещё раз.');
+        } finally {
+            setSubmitting(false);
         }
     };
 
     const nextQuestion = () => {
         if (course && activeQuestionIndex !== null) {
-            const base = API_URL.replace(/\/$/, '');
             if (activeQuestionIndex < course.questions.length - 1) {
                 const nextIndex = activeQuestionIndex + 1;
                 setActiveQuestionIndex(nextIndex);
-                // Сохраняем прогресс в localStorage и (опционально) на бэкенде
-                const userStr = localStorage.getItem('currentUser');
-                if (userStr) {
-                    try {
-                        const user = JSON.parse(userStr);
-                        const progMap = user.enrolledProgress || {};
-                        const percent = Math.round(((nextIndex) / course.questions.length) * 100);
-                        progMap[String(course.id)] = { currentIndex: nextIndex, progress_percentage: percent, correctAnswers: correctAnswersCount };
-                        const updatedUser = { ...user, enrolledProgress: progMap };
-                        localStorage.setItem('currentUser', JSON.stringify(updatedUser));
-
-                        // Попробуем уведомить бэкенд, если есть конечная точка прогресса
-                        axios.post(`${base}/api/v1/users/${user.id}/courses/${course.id}/progress`, {
-                            currentIndex: nextIndex,
-                            progress_percentage: percent
-                        }).catch(() => {});
-                    } catch (e) {
-                        console.warn('Не удалось сохранить прогресс в localStorage', e);
-                    }
-                }
-                setIsAnswerChecked(false);
-                setSelectedAnswerId(null);
+                const percent = Math.round((nextIndex / course.questions.length) * 100);
+                saveProgress(nextIndex, percent, selectedAnswers);
             } else {
-                const finalCorrect = correctAnswersCount;
-                const totalQuestions = course.questions.length;
-                setLastResult({ correct: finalCorrect, total: totalQuestions });
-
-                // Отметим курс как завершённый (100%)
-                const userStr = localStorage.getItem('currentUser');
-                if (userStr) {
-                    try {
-                        const user = JSON.parse(userStr);
-                        const progMap = user.enrolledProgress || {};
-                        progMap[String(course.id)] = { currentIndex: course.questions.length, progress_percentage: 100, correctAnswers: correctAnswersCount };
-                        const updatedUser = { ...user, enrolledProgress: progMap };
-                        localStorage.setItem('currentUser', JSON.stringify(updatedUser));
-                        axios.post(`${base}/api/v1/users/${user.id}/courses/${course.id}/progress`, {
-                            currentIndex: course.questions.length,
-                            progress_percentage: 100
-                        }).catch(() => {});
-                    } catch (e) {
-                        console.warn('Не удалось сохранить итоговый прогресс', e);
-                    }
-                }
-                setActiveQuestionIndex(null); // Возврат к описанию
+                submitAttempt();
             }
         }
     };
@@ -324,36 +326,34 @@ function CourseDetail({ theme, toggleTheme }: CourseDetailProps) {
                                     
                                     <div className="lessons-list" style={{ marginTop: '20px' }}>
                                         {course.questions[activeQuestionIndex].answers.map((answer) => {
-                                            // Логика подсветки ответов
-                                            let itemStyle = {};
-                                            if (isAnswerChecked) {
-                                                if (answer.is_correct) itemStyle = { border: '2px solid #22c55e', background: '#f0fdf4' }; // Зеленый
-                                                else if (selectedAnswerId === answer.id) itemStyle = { border: '2px solid #ef4444', background: '#fef2f2' }; // Красный
-                                            } else if (selectedAnswerId === answer.id) {
-                                                itemStyle = { border: '2px solid #3b82f6', background: '#eff6ff' }; // Синий (выбран)
-                                            }
+                                            const question = course.questions[activeQuestionIndex];
+                                            const isSelected = selectedAnswers[question.id] === answer.id;
+                                            // Подсветка выбранного ответа (синий)
+                                            const itemStyle = isSelected ? { border: '2px solid #3b82f6', background: '#eff6ff' } : {};
 
                                             return (
                                                 <div 
                                                     key={answer.id} 
                                                     className="lesson-item" 
                                                     style={{ cursor: 'pointer', ...itemStyle }}
-                                                    onClick={() => !isAnswerChecked && setSelectedAnswerId(answer.id)}
+                                                    onClick={() => !submitting && selectAnswer(question.id, answer.id)}
                                                 >
                                                     <span className="lesson-text">{answer.text}</span>
-                                                    {isAnswerChecked && answer.is_correct && <span>✅</span>}
-                                                    {isAnswerChecked && !answer.is_correct && selectedAnswerId === answer.id && <span>❌</span>}
                                                 </div>
                                             );
                                         })}
                                     </div>
 
                                     <div style={{ marginTop: '30px' }}>
-                                        {!isAnswerChecked ? (
-                                            <button className="start-course-btn" onClick={checkAnswer} disabled={selectedAnswerId === null}>Проверить</button>
-                                        ) : (
-                                            <button className="start-course-btn" onClick={nextQuestion}>Следующий вопрос →</button>
-                                        )}
+                                        <button
+                                            className="start-course-btn"
+                                            onClick={nextQuestion}
+                                            disabled={selectedAnswers[course.questions[activeQuestionIndex].id] === undefined || submitting}
+                                        >
+                                            {activeQuestionIndex < course.questions.length - 1
+                                                ? 'Следующий вопрос →'
+                                                : (submitting ? 'Проверка...' : 'Завершить тест')}
+                                        </button>
                                     </div>
                                 </div>
                             )}
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from "react";
 import axios from "axios";
-import { API_URL } from "../../api/api";
+import { API_URL, clearSession, fetchNextPage } from "../../api/api";
 import { Link, useLocation, useNavigate } from "react-router-dom";
 import Header from "../Header/Header"; // <-- ИМПОРТ HEADER
 import "./StyleHomePage.css"; 
@@ -79,6 +79,45 @@ function StreakAndDailyBox() {
 }
 
 
+// Прогресс курсов, сохранённый в localStorage при прохождении
+function readProgressMap(): Record<string, any> {
+  const userStrLocal = localStorage.getItem('currentUser');
+  if (!userStrLocal) return {};
+  try {
+    return JSON.parse(userStrLocal).enrolledProgress || {};
+  } catch (e) {
+    return {};
+  }
+}
+
+function applyProgress(courseList: any, progMap: Record<string, any>): Course[] {
+  // Защита от неожиданных ответов: если пришло не массив, пытаемся извлечь возможные поля или возвращаем пустой массив
+  if (!Array.isArray(courseList)) {
+    console.warn("applyProgress: expected array, got:", courseList);
+    if (courseList && Array.isArray(courseList.data)) {
+      courseList = courseList.data;
+    } else if (courseList && Array.isArray(courseList.courses)) {
+      courseList = courseList.courses;
+    } else {
+      return [] as Course[];
+    }
+  }
+
+  return courseList.map((c: Course) => {
+    const saved = progMap[String(c.id)];
+    if (saved && typeof saved.progress_percentage === 'number') {
+      return { ...c, progress_percentage: saved.progress_percentage };
+    }
+    // Попробуем вычислить по полям, если доступны
+    if (typeof c.completed_lessons === 'number' && typeof c.total_lessons === 'number' && c.total_lessons > 0) {
+      const pct = Math.round((c.completed_lessons / c.total_lessons) * 100);
+      return { ...c, progress_percentage: pct };
+    }
+    return c;
+  });
+}
+
+
 // --- Главный Компонент Страницы ---
 interface HomePageProps {
   theme: "dark" | "light";
@@ -95,9 +134,12 @@ function HomePage({ theme, toggleTheme }: HomePageProps) {
   const location = useLocation();
   const navigate = useNavigate();
   const [fetchTrigger, setFetchTrigger] = useState(0); // Состояние для ручного обновления
+  // Курсоры следующих страниц каталога и курсов пользователя (null — загружено всё)
+  const [nextCursors, setNextCursors] = useState<{ all: string | null; my: string | null }>({ all: null, my: null });
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const handleLogout = () => {
-    localStorage.removeItem("currentUser");
+    clearSession();
     setCurrentUser(null);
     setMyCourses([]); // Очищаем курсы пользователя
     navigate('/'); // Перенаправляем на главную для полного обновления состояния
@@ -107,85 +149,79 @@ function HomePage({ theme, toggleTheme }: HomePageProps) {
     setFetchTrigger(Date.now()); // Меняем состояние, чтобы вызвать useEffect
   };
 
+  // Следующая страница курсов пользователя или (для гостя) каталога
+  const loadMore = async () => {
+    const mine = currentUser !== null;
+    const cursor = mine ? nextCursors.my : nextCursors.all;
+    if (!cursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const path = mine ? `/v1/users/${currentUser.id}/courses` : '/v1/courses';
+      const page = await fetchNextPage<Course>(path, cursor);
+      const more = applyProgress(page.items, readProgressMap());
+      if (mine) {
+        setMyCourses(prev => [...prev, ...more]);
+        setNextCursors(prev => ({ ...prev, my: page.next }));
+      } else {
+        setAllCourses(prev => [...prev, ...more]);
+        setNextCursors(prev => ({ ...prev, all: page.next }));
+      }
+    } catch (err) {
+      console.error("Ошибка загрузки курсов:", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const loadMoreButton = (cursor: string | null) => cursor && (
+    <button className="start-button" type="button" onClick={loadMore} disabled={loadingMore}>
+      {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+    </button>
+  );
+
   // Логика загрузки данных
   useEffect(() => {
     const fetchData = async () => {
       setLoading(true);
       setError(null);
       try {
-        const timestamp = new Date().getTime();
-        const config = {
-          headers: {
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0',
-          },
-        };
+        // Бэкенд отдаёт ETag и Cache-Control: no-cache — браузер сам перепроверит
+        // актуальность ответа (304), поэтому метка времени в URL не нужна
+        const config = {};
 
         const userStr = localStorage.getItem("currentUser");
         const user = userStr ? JSON.parse(userStr) : null;
 
-        // Всегда загружаем полный список курсов
+        // Каталог, курсы пользователя и профиль приходят одним запросом
         const base = API_URL.replace(/\/$/, '');
-        const allCoursesPromise = axios.get<Course[]>(`${base}/api/v1/courses?_t=${timestamp}`, config);
-
-        // По возможности параллельно загружаем курсы пользователя
-        let myCoursesPromise = Promise.resolve({ data: [] as Course[] });
+        const params = new URLSearchParams();
         if (user && user.id) {
-          myCoursesPromise = axios.get<Course[]>(`${base}/api/v1/users/${user.id}/courses?_t=${timestamp}`, config);
+          params.set('user_id', String(user.id));
           setCurrentUser(user);
         } else {
           setCurrentUser(null);
-          localStorage.removeItem("currentUser");
+          clearSession();
         }
-
-        const [allCoursesResponse, myCoursesResponse] = await Promise.all([allCoursesPromise, myCoursesPromise]);
+        const query = params.toString();
+        const response = await axios.get<{
+          courses: Course[];
+          user_courses: Course[];
+          courses_next_cursor: string | null;
+          user_courses_next_cursor: string | null;
+        }>(
+          `${base}/api/v1/bootstrap${query ? `?${query}` : ''}`,
+          config,
+        );
 
         // Устанавливаем оба состояния: полный каталог и курсы пользователя
-        const all = allCoursesResponse.data || [];
-        const my = myCoursesResponse.data || [];
-
-        // Попытка сопоставить прогресс из localStorage (если есть)
-        const userStrLocal = localStorage.getItem('currentUser');
-        let progMap: Record<string, any> = {};
-        if (userStrLocal) {
-          try {
-            const u = JSON.parse(userStrLocal);
-            progMap = u.enrolledProgress || {};
-          } catch (e) {
-            progMap = {};
-          }
-        }
+        const all = response.data?.courses || [];
+        const my = response.data?.user_courses || [];
+
+        const progMap = readProgressMap();
 
-        const applyProgress = (courseList: any) => {
-          // Защита от неожиданных ответов: если пришло не массив, пытаемся извлечь возможные поля или возвращаем пустой массив
-          if (!Array.isArray(courseList)) {
-            console.warn("applyProgress: expected array, got:", courseList);
-            if (courseList && Array.isArray(courseList.data)) {
-              courseList = courseList.data;
-            } else if (courseList && Array.isArray(courseList.courses)) {
-              courseList = courseList.courses;
-            } else {
-              return [] as Course[];
-            }
-          }
-
-          return courseList.map((c: Course) => {
-            const saved = progMap[String(c.id)];
-            if (saved && typeof saved.progress_percentage === 'number') {
-              return { ...c, progress_percentage: saved.progress_percentage };
-            }
-            // Попробуем вычислить по полям, если доступны
-            if (typeof c.completed_lessons === 'number' && typeof c.total_lessons === 'number' && c.total_lessons > 0) {
-              const pct = Math.round((c.completed_lessons / c.total_lessons) * 100);
-              return { ...c, progress_percentage: pct };
-            }
-            return c;
-          });
-        };
-
-        setAllCourses(applyProgress(all));
-        setMyCourses(applyProgress(my));
+        setAllCourses(applyProgress(all, progMap));
+        setMyCourses(applyProgress(my, progMap));
+        setNextCursors({ all: response.data?.courses_next_cursor || null, my: response.data?.user_courses_next_cursor || null });
         console.log("All courses:", all, "My courses:", my, "progressMap:", progMap);
       } catch (err) {
         console.error("Ошибка загрузки данных:", err);
@@ -270,6 +306,7 @@ function HomePage({ theme, toggleTheme }: HomePageProps) {
                         {myCourses.map((course) => (
                           <CourseCard key={`my-${course.id}`} course={course} />
                         ))}
+                        {loadMoreButton(nextCursors.my)}
                         <div style={{ marginTop: '20px' }}>
                             <Link to="/catalog" className="auth-link">Найти больше курсов в каталоге →</Link>
                         </div>
@@ -288,6 +325,7 @@ function HomePage({ theme, toggleTheme }: HomePageProps) {
                     )) : (
                       <div className="welcome-banner">Курсы скоро появятся!</div>
                     )}
+                    {loadMoreButton(nextCursors.all)}
                   </>
                 )}
               </div>
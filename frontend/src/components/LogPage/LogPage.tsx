@@ -1,5 +1,5 @@
 import { useState, type ChangeEvent, type FormEvent, type SVGProps, type FC } from "react";
-import { API_URL } from "../../api/api";
+import { API_URL, saveSession } from "../../api/api";
 import { useNavigate } from "react-router-dom";
 import "./StyleLogPage.css";
 
@@ -86,8 +86,8 @@ function LogPage({ theme, toggleTheme }: LogPageProps) {
                 throw new Error(data.detail || "Ошибка при входе");
             }
 
-            const user = await res.json();
-            window.localStorage.setItem("currentUser", JSON.stringify(user));
+            // Профиль — в currentUser, токены сессии — отдельно (см. api.ts)
+            saveSession(await res.json());
             // Перенаправляем на главную страницу после успешного входа
             navigate('/');
         } catch (err: any) {
@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useRef } from "react";
 import { useNavigate } from "react-router-dom";
-import { API_URL } from "../../api/api";
+import { API_URL, authFetch } from "../../api/api";
 import Header from "../Header/Header";
 import Sidebar from "../Sidebar/sidebar";
 import "../HomePage/StyleHomePage.css";
@@ -60,7 +60,7 @@ function Profile(props: ProfileProps) {
   const fetchUserProfile = async (userId: number) => {
     try {
       const base = API_URL.replace(/\/$/, "");
-      const response = await fetch(`${base}/api/v1/users/${userId}`);
+      const response = await authFetch(`${base}/api/v1/users/${userId}`);
       if (response.ok) {
         const userData = await response.json();
         setCurrentUser(userData);
@@ -129,7 +129,7 @@ function Profile(props: ProfileProps) {
         return;
       }
 
-      const response = await fetch(`${base}/api/v1/users/${currentUser.id}`, {
+      const response = await authFetch(`${base}/api/v1/users/${currentUser.id}`, {
         method: "PUT",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(updateData),
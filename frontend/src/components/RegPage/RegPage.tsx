@@ -49,7 +49,7 @@ interface RegPageProps {
     toggleTheme: () => void;
 }
 
-import { API_URL } from "../../api/api";
+import { API_URL, saveSession } from "../../api/api";
 
 function RegPage({ theme, toggleTheme }: RegPageProps) {
     const [formData, setFormData] = useState({ username: '', email: '', password: '', confirmPassword: '' });
@@ -101,9 +101,8 @@ function RegPage({ theme, toggleTheme }: RegPageProps) {
                 throw new Error(data.detail || "Не удалось создать аккаунт");
             }
 
-            const user = await res.json();
-            // сохраняем текущего пользователя в localStorage
-            window.localStorage.setItem("currentUser", JSON.stringify(user));
+            // сохраняем текущего пользователя и токены сессии в localStorage
+            const user = saveSession(await res.json());
             setMessage({ text: `Аккаунт успешно создан для ${user.username}!`, type: 'success' });
         } catch (err: any) {
             setMessage({ text: err.message || 'Ошибка при регистрации', type: 'error' });
@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
+import { clearSession } from '../../api/api';
 import {
     FiUser,
     FiBookOpen,
@@ -52,7 +53,7 @@ const Sidebar: React.FC = () => {
     }, []);
 
     const handleLogout = () => {
-        localStorage.removeItem('currentUser');
+        clearSession();
         setUser(null);
         // notify same-tab listeners
         try { window.dispatchEvent(new CustomEvent('currentUserChanged')); } catch (e) {}